@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from main import (Game, SaveJournal, SaveStore, AnsiRenderer, FullRenderer, PARALLEL_MIN_CELLS, make_rng, np,
+                  read_save_file, write_save_file)
+from planner import Planner
+
+# Synthetic farms: (width, height) and the fraction of cells planted at the start
+GRID_SIZES = [(20, 15), (64, 64), (256, 256)]
+QUICK_GRID_SIZES = [(20, 15), (64, 64)]
+DENSITIES = [0.05, 0.3]
+QUICK_DENSITIES = [0.3]
+# A large mostly-empty map for the chunked backend: (width, height, plants, side of the planted square)
+SPARSE_FARMS = [(4096, 4096, 2000, 128)]
+# Grids big enough for the parallel engine, which only the step benchmark runs on
+LARGE_GRID_SIZES = [(1024, 1024)]
+# Roughly how many cell updates each benchmark's turns add up to, so big grids run fewer turns
+CELL_BUDGET = 200000
+# Slots the save benchmark stores along one run, a turn apart
+STORE_SLOTS = 10
+SEED = 1234
+
+def synthetic_scenario(width, height, plants, patch=None, seed=SEED):
+    """A scenario with plants scattered over a width x height grid, or over a patch x patch
+    square in its middle, with no events and no victory."""
+    rng = random.Random(f"scenario-{width}x{height}-{plants}-{patch}-{seed}")
+    if patch is None:
+        cells = rng.sample(range(width*height), plants)
+    else:
+        left, top = (width - patch)//2, (height - patch)//2
+        cells = [(top + y)*width + left + x for y, x in
+                 (divmod(cell, patch) for cell in rng.sample(range(patch*patch), plants))]
+    return {
+        "scenarioName": f"bench-{width}x{height}-{plants}",
+        "startingConditions": {
+            "gridSize": [width, height],
+            "playerPosition": [width//2, height//2],
+            "fullyGrownPlantsReaped": 0,
+            "grid": [{"x": cell % width, "y": cell // width, "plantType": rng.choice(["Wheat", "Corn", "Rice"]),
+                      "growthLevel": 0} for cell in cells],
+        },
+        "weatherPolicy": {"sunChance": 0.7, "rainChance": 0.3, "events": []},
+        "victoryCondition": {"type": "reap_plants", "target": 10**9},
+        "scheduledEvents": [],
+    }
+
+def farms(quick):
+    """(name, scenario, backend, area, benchmarks) for each farm; benchmarks is None for all of them."""
+    sizes, densities = (QUICK_GRID_SIZES, QUICK_DENSITIES) if quick else (GRID_SIZES, DENSITIES)
+    for width, height in sizes:
+        for density in densities:
+            plants = int(width*height*density)
+            yield f"{width}x{height}-d{density}", synthetic_scenario(width, height, plants), "dense", width*height, None
+    if not quick:
+        for width, height, plants, patch in SPARSE_FARMS:
+            # Only the tiles around the planted square get stepped
+            yield (f"{width}x{height}-n{plants}", synthetic_scenario(width, height, plants, patch), "chunked",
+                   (patch + 64)**2, None)
+        for width, height in LARGE_GRID_SIZES:
+            plants = int(width*height*DENSITIES[-1])
+            yield (f"{width}x{height}-d{DENSITIES[-1]}", synthetic_scenario(width, height, plants), "dense",
+                   width*height, {"step"})
+
+def turns_for(area, most):
+    return max(3, min(most, CELL_BUDGET // area))
+
+def new_game(scenario, backend, engine="scalar", renderer=None):
+    game = Game(scenario, engine=engine, backend=backend, headless=renderer is None, rng=make_rng("counter", SEED))
+    if renderer is not None:
+        game.renderer = renderer
+        game.autosave = None
+    return game
+
+def play(game, turns):
+    """Advance turns one at a time, with a fixed walk-and-sow pattern between them."""
+    moves = ['d', 'sow up', 's', 'sow left', 'a', 'sow down', 'w', 'sow right']
+    for turn in range(turns):
+        game.handleInputCommand(moves[turn % len(moves)])
+        game.nextTurn()
+
+def best_of(repeat, run):
+    """Run run() repeat times and keep the fastest result (the one with the smallest 'seconds')."""
+    return min((run() for _ in range(repeat)), key=lambda result: result["seconds"])
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values)-1, int(fraction*len(values)))]
+
+def bench_step(scenario, backend, area, repeat):
+    turns = turns_for(area, 500)
+    engines = ["scalar"] + (["vectorized"] if np is not None and backend == "dense" else [])
+    if "vectorized" in engines and area >= PARALLEL_MIN_CELLS:
+        engines.append("parallel")
+    metrics = []
+    for engine in engines:
+        def run():
+            game = new_game(scenario, backend, engine)
+            if engine == "parallel":
+                # Start the pool outside the timing
+                game.nextTurn()
+            start = time.perf_counter()
+            for _ in range(turns):
+                game.nextTurn()
+            seconds = time.perf_counter() - start
+            if engine == "parallel":
+                game.engine.close()
+            return {"seconds": seconds}
+        result = best_of(repeat, run)
+        metric = "turnsPerSec" if engine == "scalar" else f"{engine}TurnsPerSec"
+        metrics.append((metric, turns / result["seconds"], "turns/s", "higher"))
+    return metrics
+
+def bench_history(scenario, backend, area, repeat):
+    game = new_game(scenario, backend)
+    play(game, turns_for(area, 40))
+    undo, redo = [], []
+    for _ in range(repeat):
+        while True:
+            start = time.perf_counter()
+            if not game.history.undo(game.gameState):
+                break
+            undo.append(time.perf_counter() - start)
+        while True:
+            start = time.perf_counter()
+            if not game.history.redo(game.gameState):
+                break
+            redo.append(time.perf_counter() - start)
+    # A history push after a turn's weather and growth, without the rest of nextTurn
+    pushes = []
+    for _ in range(turns_for(area, 20)):
+        turn = game.getTurnNumber() + 1
+        game.setTurnNumber(turn)
+        game.stepGrid(turn)
+        start = time.perf_counter()
+        game.pushStateToHistory()
+        pushes.append(time.perf_counter() - start)
+    return [
+        ("pushMedianMs", statistics.median(pushes)*1e3, "ms", "lower"),
+        ("undoMedianMs", statistics.median(undo)*1e3, "ms", "lower"),
+        ("undoP95Ms", percentile(undo, 0.95)*1e3, "ms", "lower"),
+        ("redoMedianMs", statistics.median(redo)*1e3, "ms", "lower"),
+        ("redoP95Ms", percentile(redo, 0.95)*1e3, "ms", "lower"),
+    ]
+
+def bench_save(scenario, backend, area, repeat):
+    turns = turns_for(area, 40)
+    game = new_game(scenario, backend)
+    play(game, turns)
+    width, height = game.width, game.height
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.sav")
+
+        def write():
+            start = time.perf_counter()
+            write_save_file(path, game.history.entries, game.fullyGrownPlantsReaped, width, height)
+            return {"seconds": time.perf_counter() - start}
+
+        def read():
+            start = time.perf_counter()
+            read_save_file(path, width, height)
+            return {"seconds": time.perf_counter() - start}
+        writeSeconds = best_of(repeat, write)["seconds"]
+        readSeconds = best_of(repeat, read)["seconds"]
+        size = os.path.getsize(path)
+
+        # The autosave path: one journal record per command after an initial compaction
+        journal = SaveJournal(os.path.join(directory, "autosave"), width, height)
+        game.history.drainPending()
+        journal.record(game.history, 0)
+        records = []
+        for turn in range(turns):
+            play(game, 1)
+            start = time.perf_counter()
+            journal.record(game.history, 0)
+            records.append(time.perf_counter() - start)
+        journalBytes = os.path.getsize(journal.journalPath)
+        start = time.perf_counter()
+        journal.load()
+        loadSeconds = time.perf_counter() - start
+
+        # Slots saved along the run share most of their entries
+        store = SaveStore(os.path.join(directory, "saves"))
+        slotSaves = []
+        for slot in range(STORE_SLOTS):
+            play(game, 1)
+            start = time.perf_counter()
+            store.save(f"slot{slot}", game.history.entries, 0, width, height, game.getTurnNumber())
+            slotSaves.append(time.perf_counter() - start)
+        storeBytes = sum(os.path.getsize(os.path.join(store.directory, name)) for name in os.listdir(store.directory))
+
+        def load():
+            start = time.perf_counter()
+            SaveStore(store.directory).load(f"slot{STORE_SLOTS-1}", width, height)
+            return {"seconds": time.perf_counter() - start}
+        slotLoadSeconds = best_of(repeat, load)["seconds"]
+
+    return [
+        ("saveBytes", size, "bytes", "lower"),
+        ("writeMBps", size / writeSeconds / 1e6, "MB/s", "higher"),
+        ("readMBps", size / readSeconds / 1e6, "MB/s", "higher"),
+        ("journalRecordMs", statistics.median(records)*1e3, "ms", "lower"),
+        ("journalBytesPerTurn", journalBytes / turns, "bytes", "lower"),
+        ("autosaveLoadMs", loadSeconds*1e3, "ms", "lower"),
+        ("storeBytesPerSlot", storeBytes / STORE_SLOTS, "bytes", "lower"),
+        ("storeSaveMs", statistics.median(slotSaves)*1e3, "ms", "lower"),
+        ("storeLoadMs", slotLoadSeconds*1e3, "ms", "lower"),
+    ]
+
+def bench_render(scenario, backend, area, repeat):
+    turns = turns_for(area, 30)
+    metrics = []
+    for name, make in (("full", FullRenderer), ("ansi", lambda: AnsiRenderer(io.StringIO()))):
+        def run():
+            out = io.StringIO()
+            renderer = make()
+            game = new_game(scenario, backend, renderer=renderer)
+            frames = []
+            with contextlib.redirect_stdout(out):
+                for turn in range(turns):
+                    play(game, 1)
+                    start = time.perf_counter()
+                    game.draw()
+                    frames.append(time.perf_counter() - start)
+            written = len(renderer.out.getvalue()) if name == "ansi" else len(out.getvalue())
+            return {"seconds": statistics.median(frames), "bytes": written / turns}
+        result = best_of(repeat, run)
+        metrics.append((f"{name}FrameMs", result["seconds"]*1e3, "ms", "lower"))
+        metrics.append((f"{name}BytesPerFrame", result["bytes"], "bytes", "lower"))
+    return metrics
+
+def bench_plan(scenario, backend, area, repeat):
+    # The synthetic farms can't be won, so every run expands exactly its node budget
+    nodes = turns_for(area, 4000)
+    scenario = dict(scenario, startingConditions=dict(scenario["startingConditions"], storage=backend))
+
+    def run():
+        planner = Planner(scenario, make_rng("counter", SEED), beamWidth=16, maxNodes=nodes)
+        planner.search()
+        return {"seconds": planner.seconds, "nodes": planner.nodes}
+    result = best_of(repeat, run)
+    return [("nodesPerSec", result["nodes"] / result["seconds"], "nodes/s", "higher")]
+
+def bench_fork(scenario, backend, area, repeat):
+    game = new_game(scenario, backend)
+    play(game, turns_for(area, 20))
+    forks = max(10, min(1000, CELL_BUDGET*10 // area))
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(forks):
+            game.fork()
+        return {"seconds": time.perf_counter() - start}
+
+    # A branch's first turn copies every tile it writes to
+    def branch():
+        child = game.fork()
+        start = time.perf_counter()
+        child.nextTurn()
+        return {"seconds": time.perf_counter() - start}
+    return [
+        ("forksPerSec", forks / best_of(repeat, run)["seconds"], "forks/s", "higher"),
+        ("forkFirstTurnMs", best_of(repeat, branch)["seconds"]*1e3, "ms", "lower"),
+    ]
+
+BENCHMARKS = {
+    "step": bench_step,
+    "history": bench_history,
+    "save": bench_save,
+    "render": bench_render,
+    "plan": bench_plan,
+    "fork": bench_fork,
+}
+
+def run_benchmarks(only=None, quick=False, repeat=3, log=None):
+    """Results as a list of {name, metric, value, unit, better} dicts."""
+    results = []
+    for farmName, scenario, backend, area, benchmarks in farms(quick):
+        for benchName, bench in BENCHMARKS.items():
+            if (only and benchName not in only) or (benchmarks is not None and benchName not in benchmarks):
+                continue
+            if log:
+                log(f"{benchName}/{farmName}")
+            for metric, value, unit, better in bench(scenario, backend, area, repeat):
+                results.append({"name": f"{benchName}/{farmName}", "metric": metric, "value": value,
+                                "unit": unit, "better": better})
+    return results
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__ if np is not None else None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(current, baseline, threshold):
+    """Rows of (name, metric, old, new, change) and the rows that got worse by more than threshold."""
+    old = {(r["name"], r["metric"]): r for r in baseline["results"]}
+    rows, regressions = [], []
+    for result in current["results"]:
+        before = old.get((result["name"], result["metric"]))
+        if before is None or before["value"] == 0:
+            continue
+        change = result["value"] / before["value"] - 1
+        row = (result["name"], result["metric"], before["value"], result["value"], change)
+        rows.append(row)
+        worse = -change if result["better"] == "higher" else change
+        if worse > threshold:
+            regressions.append(row)
+    return rows, regressions
+
+def print_comparison(rows, regressions, out):
+    flagged = set(regressions)
+    for name, metric, before, after, change in rows:
+        mark = "  REGRESSION" if (name, metric, before, after, change) in flagged else ""
+        out.write(f"{name:<28}{metric:<24}{before:>14.4g}{after:>14.4g}{change*100:>+9.1f}%{mark}\n")
+    out.write(f"{len(regressions)} regression(s) out of {len(rows)} metrics\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark turn stepping, history, saves, rendering, planning and forks.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run just these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small grids only")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is kept")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier results file")
+    parser.add_argument("--current", metavar="RESULTS", help="with --compare, compare this results file instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current, "r") as f:
+            current = json.load(f)
+    else:
+        log = lambda text: print(text, file=sys.stderr)
+        current = {"environment": environment(), "quick": args.quick, "repeat": args.repeat,
+                   "results": run_benchmarks(args.only, args.quick, args.repeat, log)}
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+        if not args.compare:
+            for r in current["results"]:
+                print(f"{r['name']:<28}{r['metric']:<24}{r['value']:>14.4g} {r['unit']}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(current, baseline, args.threshold)
+        print_comparison(rows, regressions, sys.stdout)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,126 @@
 #!/usr/bin/env python3
 
+import argparse
+import hashlib
 import json
+import math
+import mmap
+import multiprocessing
 import os
+import struct
 import sys
 import random
+import string
+import threading
+import time
+import weakref
+from array import array
+from collections import deque
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
 
 # Enums and Data Structures
 class PlantType:
+    """Plant IDs stored in the grid. 0 is no plant; the base crop pack's
+    crops come first, so they always get these IDs."""
     NoneType = 0
     Wheat = 1
     Corn = 2
     Rice = 3
 
 # Growth DSL
+# Each rule kind compiles to a scalar expression and an array (mask) expression
+# over: sun, moisture, same (same-type neighbors), adjacent (non-empty
+# neighbors), turn and events (active weather events). {0}, {1} are the rule's
+# arguments, bound as constants in the generated function.
+GROWTH_RULE_EXPRESSIONS = {
+    "sunAbove": ("sun > {0}", "(sun > {0})"),
+    "moistureAbove": ("moisture > {0}", "(moisture > {0})"),
+    "moistureBetween": ("{0} <= moisture <= {1}", "({0} <= moisture) & (moisture <= {1})"),
+    "adjacentSameType": ("same >= {0}", "(same >= {0})"),
+    "adjacentAnyType": ("adjacent >= {0}", "(adjacent >= {0})"),
+    "turnGreaterThan": ("turn > {0}", "(turn > {0})"),
+    "weatherEventActive": ("events.get({0}, 0) > 0", "(events.get({0}, 0) > 0)"),
+}
+
+class GrowthEvaluator:
+    """Fused form of a plant's growth rules.
+
+    check(sun, moisture, same, adjacent, turn, events) tests one cell;
+    mask(...) takes NumPy arrays for the per-cell inputs and tests them all.
+    """
+    def __init__(self, rules):
+        namespace = {"np": np}
+        scalar_terms = []
+        mask_terms = ["np.ones(np.shape(sun), dtype=bool)"]
+        for kind, args in rules:
+            names = []
+            for arg in args:
+                name = f"c{len(namespace)}"
+                namespace[name] = arg
+                names.append(name)
+            scalar_expr, mask_expr = GROWTH_RULE_EXPRESSIONS[kind]
+            scalar_terms.append(scalar_expr.format(*names))
+            mask_terms.append(mask_expr.format(*names))
+
+        params = "sun, moisture, same, adjacent, turn, events"
+        source = (
+            f"def check({params}):\n"
+            f"    return {' and '.join(scalar_terms) or 'True'}\n"
+            f"def mask({params}):\n"
+            f"    return {' & '.join(mask_terms)}\n"
+        )
+        exec(source, namespace)
+        self.source = source
+        self.check = namespace["check"]
+        self.mask = namespace["mask"]
+
 class PlantDefinition:
-    def __init__(self, name, plant_type):
+    def __init__(self, name, plant_type, glyph=None, max_growth=3):
         self.name = name
         self.type = plant_type
+        self.glyph = glyph or name[0].upper()
+        self.max_growth = max_growth
         self.growth_conditions = []
+        # (kind, args) for each condition, the form compile() works from
+        self.rules = []
+        self._evaluator = None
+
+    def compile(self):
+        # Conditions appended by hand have no rule and can't be fused
+        if len(self.rules) != len(self.growth_conditions):
+            return None
+        if self._evaluator is None or self._evaluator.ruleCount != len(self.rules):
+            self._evaluator = GrowthEvaluator(self.rules)
+            self._evaluator.ruleCount = len(self.rules)
+        return self._evaluator
 
 class PlantDefinitionBuilder:
-    def __init__(self, name, plant_type):
-        self.definition = PlantDefinition(name, plant_type)
+    def __init__(self, name, plant_type=None, glyph=None, max_growth=3):
+        self.definition = PlantDefinition(name, plant_type, glyph, max_growth)
 
     def requireSunAbove(self, threshold):
         self.definition.growth_conditions.append(lambda ctx: ctx["sun"] > threshold)
+        self.definition.rules.append(("sunAbove", (threshold,)))
         return self
 
     def requireMoistureAbove(self, threshold):
         self.definition.growth_conditions.append(lambda ctx: ctx["moisture"] > threshold)
+        self.definition.rules.append(("moistureAbove", (threshold,)))
         return self
 
     def requireMoistureBetween(self, min_val, max_val):
         self.definition.growth_conditions.append(lambda ctx: min_val <= ctx["moisture"] <= max_val)
+        self.definition.rules.append(("moistureBetween", (min_val, max_val)))
         return self
 
     def requireAdjacentSameType(self, count):
@@ -41,6 +129,7 @@ class PlantDefinitionBuilder:
             same_count = sum(1 for n in neighbors if n == self.definition.type)
             return same_count >= count
         self.definition.growth_conditions.append(cond)
+        self.definition.rules.append(("adjacentSameType", (count,)))
         return self
 
     def requireAdjacentAnyType(self, count):
@@ -49,62 +138,219 @@ class PlantDefinitionBuilder:
             non_empty = sum(1 for n in neighbors if n != PlantType.NoneType)
             return non_empty >= count
         self.definition.growth_conditions.append(cond)
+        self.definition.rules.append(("adjacentAnyType", (count,)))
         return self
 
     def requireTurnGreaterThan(self, turn_number):
         self.definition.growth_conditions.append(lambda ctx: ctx["turn"] > turn_number)
+        self.definition.rules.append(("turnGreaterThan", (turn_number,)))
         return self
 
     def requireWeatherEventActive(self, event_name):
         self.definition.growth_conditions.append(lambda ctx: ctx["isWeatherEventActive"](event_name))
+        self.definition.rules.append(("weatherEventActive", (event_name,)))
         return self
 
     def done(self):
         return self.definition
 
-def define_plant(name, plant_type):
-    return PlantDefinitionBuilder(name, plant_type)
+def define_plant(name, plant_type=None, glyph=None, max_growth=3):
+    return PlantDefinitionBuilder(name, plant_type, glyph, max_growth)
+
+# Plant IDs are stored in one byte per cell
+MAX_PLANT_TYPES = 256
 
 class PlantRegistry:
-    plants = {}
+    """Every known crop, by dense integer ID.
+
+    IDs are handed out in registration order starting at 1. The lookup
+    tables are indexed by ID: definitions, glyphs and maxGrowth (0 for no
+    plant and for unused IDs, so `growth < maxGrowth[type]` is the whole
+    "can still grow" test), plus ids, keyed by lower-case name.
+    """
+    definitions = [None]
+    ids = {}
+    glyphs = ['.']
+    maxGrowth = bytearray(MAX_PLANT_TYPES)
 
     @classmethod
     def register(cls, definition):
-        cls.plants[definition.type] = definition
+        plant_type = definition.type if definition.type is not None else cls.ids.get(definition.name.lower())
+        if plant_type is None:
+            plant_type = len(cls.definitions)
+        if not 0 < plant_type <= len(cls.definitions) or plant_type >= MAX_PLANT_TYPES:
+            raise ValueError(f"Plant {definition.name!r} can't have ID {plant_type}; the next free ID is {len(cls.definitions)}")
+        definition.type = plant_type
+        if plant_type == len(cls.definitions):
+            cls.definitions.append(definition)
+            cls.glyphs.append(definition.glyph)
+        else:
+            del cls.ids[cls.definitions[plant_type].name.lower()]
+            cls.definitions[plant_type] = definition
+            cls.glyphs[plant_type] = definition.glyph
+        cls.ids[definition.name.lower()] = plant_type
+        cls.maxGrowth[plant_type] = definition.max_growth
 
     @classmethod
     def get_definition(cls, plant_type):
-        return cls.plants.get(plant_type, None)
-
-# Adjust thresholds to match your system (sun/moisture discrete values)
-PlantRegistry.register(
-    define_plant("Wheat", PlantType.Wheat)
-    .requireMoistureAbove(10)  # adjusted from large values to a practical threshold
-    .requireAdjacentSameType(1)
-    .done()
-)
-
-PlantRegistry.register(
-    define_plant("Corn", PlantType.Corn)
-    .requireSunAbove(128)
-    .done()
-)
-
-PlantRegistry.register(
-    define_plant("Rice", PlantType.Rice)
-    .requireMoistureBetween(10, 25)
-    .requireAdjacentAnyType(2)
-    .done()
-)
-
+        return cls.definitions[plant_type] if plant_type < len(cls.definitions) else None
+
+# Crop packs: JSON or TOML files with a list of crops, each with a name, a
+# one-character glyph, maxGrowth and conditions written as [rule, args...]
+# using the rule names of GROWTH_RULE_EXPRESSIONS. Conditions are only
+# compiled when a crop is first checked for growth, so loading a big pack
+# costs little more than parsing it.
+CROP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crops")
+RESERVED_GLYPHS = ('.', 'P')
+_loadedCropPacks = {}
+
+class CropPackError(ValueError):
+    pass
+
+def _rule_arity(kind):
+    return len({field for _, field, _, _ in string.Formatter().parse(GROWTH_RULE_EXPRESSIONS[kind][0]) if field})
+
+def _check_crop(errors, where, crop):
+    if not isinstance(crop, dict) or not isinstance(crop.get('name'), str) or not crop['name']:
+        errors.append(f"{where} must be an object with a name")
+        return False
+    glyph = crop.get('glyph', crop['name'][0].upper())
+    if not isinstance(glyph, str) or len(glyph) != 1 or glyph in RESERVED_GLYPHS:
+        errors.append(f"{where}.glyph must be one character other than {' or '.join(RESERVED_GLYPHS)}, got {glyph!r}")
+    maxGrowth = crop.get('maxGrowth', 3)
+    if not isinstance(maxGrowth, int) or isinstance(maxGrowth, bool) or not 1 <= maxGrowth <= 255:
+        errors.append(f"{where}.maxGrowth must be an integer between 1 and 255, got {maxGrowth!r}")
+    conditions = crop.get('conditions', [])
+    if not isinstance(conditions, list):
+        errors.append(f"{where}.conditions must be a list")
+        return False
+    for i, condition in enumerate(conditions):
+        if not isinstance(condition, list) or not condition or condition[0] not in GROWTH_RULE_EXPRESSIONS:
+            errors.append(f"{where}.conditions[{i}] must be [rule, args...] with rule one of "
+                          f"{', '.join(GROWTH_RULE_EXPRESSIONS)}, got {condition!r}")
+        elif len(condition) - 1 != _rule_arity(condition[0]):
+            errors.append(f"{where}.conditions[{i}]: {condition[0]} takes {_rule_arity(condition[0])} argument(s)")
+    return True
+
+def load_crop_pack(name, directory=CROP_DIR):
+    """Register the crops in crops/name.json (or name.toml) and return their IDs.
+
+    Loading a pack again returns the IDs it got the first time. Raises
+    CropPackError if the pack is malformed or reuses a name another pack
+    already registered.
+    """
+    path = os.path.join(directory, f"{name}.json")
+    if not os.path.exists(path) and tomllib is not None and os.path.exists(os.path.join(directory, f"{name}.toml")):
+        path = os.path.join(directory, f"{name}.toml")
+    path = os.path.abspath(path)
+    if path in _loadedCropPacks:
+        return _loadedCropPacks[path]
+    try:
+        if path.endswith(".toml"):
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, "r") as f:
+                data = json.load(f)
+    except OSError as e:
+        raise CropPackError(f"Can't read crop pack {name!r}: {e}") from None
+    except ValueError as e:
+        raise CropPackError(f"{path} is not a valid crop pack: {e}") from None
+
+    crops = data.get('crops') if isinstance(data, dict) else None
+    errors = [] if isinstance(crops, list) else ["crops must be a list"]
+    names = set()
+    for i, crop in enumerate(crops or []):
+        if _check_crop(errors, f"crops[{i}]", crop):
+            key = crop['name'].lower()
+            if key in names or key in PlantRegistry.ids:
+                errors.append(f"crops[{i}]: crop {crop['name']!r} is already defined")
+            names.add(key)
+    if len(PlantRegistry.definitions) + len(names) > MAX_PLANT_TYPES:
+        errors.append(f"too many crops; at most {MAX_PLANT_TYPES-1} can be loaded at once")
+    if errors:
+        raise CropPackError(f"{path} is not a valid crop pack:\n  " + "\n  ".join(errors))
+
+    ids = []
+    for crop in crops:
+        builder = define_plant(crop['name'], None, crop.get('glyph'), crop.get('maxGrowth', 3))
+        for kind, *args in crop.get('conditions', []):
+            getattr(builder, "require" + kind[0].upper() + kind[1:])(*args)
+        definition = builder.done()
+        PlantRegistry.register(definition)
+        ids.append(definition.type)
+    _loadedCropPacks[path] = ids
+    return ids
+
+load_crop_pack("base")
+# What sowing picks from until a scenario unlocks more
+DEFAULT_PLANT_TYPES = ["Wheat", "Corn", "Rice"]
+
+# Default grid size; scenarios can set their own with startingConditions.gridSize
 GRID_WIDTH = 20
 GRID_HEIGHT = 15
 CELL_DATA_SIZE = 4  # sun, moisture, plantType, growthLevel
-PLAYER_DATA_SIZE = 2
-TURN_DATA_SIZE = 4
-CELL_COUNT = GRID_WIDTH * GRID_HEIGHT
-GRID_DATA_SIZE = CELL_COUNT * CELL_DATA_SIZE
-GAME_STATE_SIZE = GRID_DATA_SIZE + PLAYER_DATA_SIZE + TURN_DATA_SIZE
+# gameState is one byte per cell field followed by this tail, in native
+# byte order so it can be read through memoryview casts
+STATE_TAIL = struct.Struct("=HHI")  # player x, player y, turn
+SAVE_TAIL = struct.Struct("<HHI")
+PLAYER_DATA_SIZE = 4
+# The turn is a uint32 in the state tail
+MAX_TURN = 0xFFFFFFFF
+# JSON exports keep the old list layout: player x, player y, then four turn slots
+JSON_TAIL_SIZE = 6
+# Grids bigger than this use the chunked backend unless the scenario says otherwise
+DENSE_MAX_CELLS = 1 << 20
+# Flat state indices have to fit the uint32 diffs in history and saves
+MAX_GRID_CELLS = 1 << 30
+CHUNK_SIZE = 32
+# Bytes per page of a forked dense grid (see PagedGrid)
+PAGE_SIZE = 4096
+# Game.applyChanges rebuilds the cell indexes outright past this many changes per cell
+BULK_CHANGE_CELLS = 0.25
+# Renderers show at most this many cells around the player
+VIEWPORT_WIDTH = 40
+VIEWPORT_HEIGHT = 30
+HISTORY_DEPTH = 100
+HISTORY_KEYFRAME_INTERVAL = 32
+
+# Binary saves: header, then every history entry oldest first. A keyframe is
+# the raw gameState buffer. A diff is a uint32 count followed by uint32 byte
+# offsets into the state, then the old bytes and the new bytes. Everything
+# is little-endian. Version 3 adds the sun chance table after the entries:
+# a uint32 count, then SUN_CHANCE records. Version 4 adds SAVE_RNG after the
+# header, since the sun of cells without a growing plant is redrawn from it.
+# Version 5 adds the crop name of each plant ID after that (see
+# encode_plant_names), since IDs depend on the order crop packs were loaded in.
+SAVE_MAGIC = b"FARM"
+SAVE_VERSION = 5
+# Versions read_save_file and SaveJournal.load still accept
+SAVE_READ_VERSIONS = (2, 3, 4, 5)
+SAVE_HEADER = struct.Struct("<4sHHHIII")  # magic, version, width, height, generation, reaped, entries
+SAVE_RNG = struct.Struct("<8sQ")          # rng kind (empty if unknown), seed
+SAVE_KEYFRAME = 0
+SAVE_DIFF = 1
+# Chunked keyframe: uint32 chunk count, then for each allocated chunk its
+# uint32 chunk x/y and CHUNK_SIZE*CHUNK_SIZE cells, then player and turn
+SAVE_CHUNKED_KEYFRAME = 2
+SAVE_CHUNK_KEY = struct.Struct("<II")
+# The journal holds entries pushed since its save was written, each with the
+# history length before the push (so undos can be replayed) and the reap count
+JOURNAL_HEADER = struct.Struct("<4sHI")    # magic, version, generation of its save; then SAVE_RNG from version 4
+JOURNAL_RECORD = struct.Struct("<III")     # payload length, entries before push, reaped
+# In place of entries before push: the record holds sun chance changes, NaN for a removed turn
+JOURNAL_SUN_CHANCES = 0xFFFFFFFF
+# Game.eventSunChances entries: turn, sun chance
+SUN_CHANCE = struct.Struct("<Id")
+JOURNAL_COMPACT_RECORDS = 64
+# How long the autosave writer waits after a save request for more to arrive
+AUTOSAVE_COALESCE_SECONDS = 0.05
+# Save store layout; see SaveStore
+SAVE_STORE_DIR = "saves"
+STORE_VERSION = 1
+STORE_DIGEST_SIZE = 16
+STORE_BLOCK = struct.Struct(f"<{STORE_DIGEST_SIZE}sQI")  # digest, offset in the pack, length
+STORE_BLOCK_SIZE = 8192
 
 class Direction:
     Up = "up"
@@ -112,29 +358,2117 @@ class Direction:
     Left = "left"
     Right = "right"
 
+# Random number generators
+# Every draw is addressed by (turn, stream, index) rather than taken from one
+# running sequence, so replaying a turn after an undo gives the same weather
+# and the same seeds, and a run is reproducible from its seed alone. Weather
+# for a turn is one bulk call: index 2*cell is the sun draw for that cell and
+# 2*cell+1 the rain draw.
+RNG_STREAM_WEATHER = 0
+RNG_STREAM_SOW = 1
+MASK64 = (1 << 64) - 1
+
+def _splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+def _random_seed():
+    return int.from_bytes(os.urandom(8), "little")
+
+class GameRng:
+    kind = None
+
+    def __init__(self, seed=None):
+        self.seed = _random_seed() if seed is None else seed
+        self._weatherTurn = None
+        self._weather = []
+
+    def weather(self, turn, count):
+        """count uniform floats in [0, 1) for this turn, as a list."""
+        raise NotImplementedError
+
+    def weatherArray(self, turn, count):
+        return np.array(self.weather(turn, count))
+
+    def weatherAt(self, turn, indices):
+        """This turn's weather draws at the given indices only."""
+        if not indices:
+            return []
+        if self._weatherTurn != turn or len(self._weather) <= max(indices):
+            self._weatherTurn = turn
+            self._weather = self.weather(turn, max(indices)+1)
+        return [self._weather[i] for i in indices]
+
+    def choice(self, options, turn, key):
+        raise NotImplementedError
+
+class StdlibRng(GameRng):
+    """random.Random reseeded per (turn, stream)."""
+    kind = "stdlib"
+
+    def generator(self, turn, stream, key=0):
+        return random.Random(_splitmix64(self.seed ^ _splitmix64((turn << 8 | stream) ^ _splitmix64(key))))
+
+    def weather(self, turn, count):
+        draw = self.generator(turn, RNG_STREAM_WEATHER).random
+        return [draw() for _ in range(count)]
+
+    def choice(self, options, turn, key):
+        return self.generator(turn, RNG_STREAM_SOW, key).choice(options)
+
+class NumpyRng(GameRng):
+    """NumPy PCG64 Generator seeded per (turn, stream)."""
+    kind = "numpy"
+
+    def generator(self, turn, stream, key=0):
+        return np.random.default_rng([self.seed & MASK64, turn, stream, key])
+
+    def weather(self, turn, count):
+        return self.weatherArray(turn, count).tolist()
+
+    def weatherArray(self, turn, count):
+        return self.generator(turn, RNG_STREAM_WEATHER).random(count)
+
+    def choice(self, options, turn, key):
+        return options[int(self.generator(turn, RNG_STREAM_SOW, key).integers(len(options)))]
+
+class CounterRng(GameRng):
+    """Counter-based generator: draw i of (turn, stream) is a SplitMix64 hash
+    of the seed, turn, stream and i. Any draw of any turn can be computed
+    directly without generating the ones before it."""
+    kind = "counter"
+
+    def streamKey(self, turn, stream):
+        return _splitmix64(self.seed ^ _splitmix64(turn << 8 | stream))
+
+    def value(self, turn, stream, index):
+        return (_splitmix64((self.streamKey(turn, stream) + index*0x9E3779B97F4A7C15) & MASK64) >> 11) * 2.0**-53
+
+    def weather(self, turn, count):
+        key = self.streamKey(turn, RNG_STREAM_WEATHER)
+        return [(_splitmix64((key + i*0x9E3779B97F4A7C15) & MASK64) >> 11) * 2.0**-53 for i in range(count)]
+
+    def weatherAt(self, turn, indices):
+        key = self.streamKey(turn, RNG_STREAM_WEATHER)
+        return [(_splitmix64((key + i*0x9E3779B97F4A7C15) & MASK64) >> 11) * 2.0**-53 for i in indices]
+
+    def weatherArray(self, turn, count, start=0):
+        """Draws start..start+count-1 of this turn's weather."""
+        indices = np.arange(start, start+count, dtype=np.uint64)
+        x = np.uint64(self.streamKey(turn, RNG_STREAM_WEATHER)) + indices*np.uint64(0x9E3779B97F4A7C15)
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+        return (x >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+    def choice(self, options, turn, key):
+        return options[int(self.value(turn, RNG_STREAM_SOW, key) * len(options))]
+
+class ForkedRng(GameRng):
+    """A forked game's rng: its parent's draws for the turns up to the fork,
+    which the two games' states share, and its own after. Saves record its
+    own kind and seed."""
+    def __init__(self, parent, own, turn):
+        self.parent = parent
+        self.own = own
+        self.turn = turn
+        self.kind = own.kind
+        self.seed = own.seed
+
+    def rng(self, turn):
+        return self.parent if turn <= self.turn else self.own
+
+    def weather(self, turn, count):
+        return self.rng(turn).weather(turn, count)
+
+    def weatherArray(self, turn, count):
+        return self.rng(turn).weatherArray(turn, count)
+
+    def weatherAt(self, turn, indices):
+        return self.rng(turn).weatherAt(turn, indices)
+
+    def choice(self, options, turn, key):
+        return self.rng(turn).choice(options, turn, key)
+
+RNG_KINDS = {rng.kind: rng for rng in (CounterRng, StdlibRng, NumpyRng)}
+
+def make_rng(kind="counter", seed=None):
+    return RNG_KINDS[kind](seed)
+
+def weather_cells(cells, draws, sunChance, rainChance):
+    """Write a turn's sun and rain into an int32 (rows, columns, CELL_DATA_SIZE) array
+    from its (rows, columns, 2) weather draws."""
+    cells[:, :, 0] = np.where(draws[:, :, 0] < sunChance, 255, 0)
+    rain = np.where(draws[:, :, 1] < rainChance, 255, 0)
+    cells[:, :, 1] = np.minimum(cells[:, :, 1] + (rain*0.5).astype(np.int32), 255)
+
+def neighbor_count_arrays(plantTypes):
+    """(same-type, non-empty) neighbor counts of every cell in a 2D array of plant types."""
+    rows, columns = plantTypes.shape
+    padded = np.zeros((rows+2, columns+2), dtype=plantTypes.dtype)
+    padded[1:-1, 1:-1] = plantTypes
+    same = np.zeros((rows, columns), dtype=np.uint8)
+    adjacent = np.zeros((rows, columns), dtype=np.uint8)
+    for neighbor in (padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]):
+        occupied = neighbor != PlantType.NoneType
+        adjacent += occupied
+        same += occupied & (neighbor == plantTypes)
+    return same, adjacent
+
+class VectorizedEngine:
+    """Whole-grid turn step over NumPy arrays.
+
+    Weather is drawn for the whole grid in one batch, the same draws the
+    scalar loop uses, so a seeded run gives identical results.
+    """
+    def __init__(self, game):
+        self.game = game
+
+    def step(self, turn):
+        game = self.game
+        state = game.gameState
+        shape = (game.height, game.width)
+        buffer = np.frombuffer(state, dtype=np.uint8, count=game.gridDataSize).reshape(shape + (CELL_DATA_SIZE,))
+        cells = buffer.astype(np.int32)
+
+        started = game.profiler.begin()
+        draws = game.rng.weatherArray(turn, 2*game.cellCount).reshape(shape + (2,))
+        game.profiler.end("weather", started)
+        started = game.profiler.begin()
+        game.recordSunChance(turn, game.getCurrentSunChance())
+        weather_cells(cells, draws, game.getCurrentSunChance(), game.getCurrentRainChance())
+
+        # Before growth, which may write the new moisture back to buffer early
+        saturated = np.flatnonzero((buffer[:, :, 1] < 255) & (cells[:, :, 1] >= 255))
+        plantType = cells[:, :, 2]
+        maxGrowth = np.frombuffer(PlantRegistry.maxGrowth, dtype=np.uint8)
+        growable = cells[:, :, 3] < maxGrowth[plantType]
+        if growable.any():
+            sameCount = np.frombuffer(game.sameNeighbors, dtype=np.uint8).reshape(shape)
+            anyCount = np.frombuffer(game.anyNeighbors, dtype=np.uint8).reshape(shape)
+            arrays = {
+                "buffer": buffer,
+                "cells": cells,
+                "sun": cells[:, :, 0],
+                "moisture": cells[:, :, 1],
+                "sameNeighbors": sameCount,
+                "anyNeighbors": anyCount,
+            }
+            grow = np.zeros_like(growable)
+            for pt in np.unique(plantType[growable]):
+                mask = growable & (plantType == pt)
+                grow |= mask & self.growthMask(int(pt), mask, arrays, turn)
+            cells[:, :, 3] += grow
+
+        buffer[...] = cells
+        if game.cellSetsShared:
+            game.ownCellSets()
+        game.thirstyCells.difference_update(saturated.tolist())
+        if growable.any():
+            for cell in np.flatnonzero(grow & (cells[:, :, 3] >= maxGrowth[plantType])).tolist():
+                game.trackCell(cell)
+        game.profiler.end("growth", started)
+
+    def growthMask(self, plantType, mask, arrays, turn):
+        definition = PlantRegistry.get_definition(plantType)
+        if definition is None:
+            return np.zeros_like(mask)
+        evaluator = definition.compile()
+        if evaluator is None:
+            # Hand-written conditions have no array form; check those cells one by one
+            # against the grid with this turn's weather already written back
+            arrays["buffer"][...] = arrays["cells"]
+            result = np.zeros_like(mask)
+            for y, x in zip(*np.nonzero(mask)):
+                result[y, x] = self.game.checkGrowthConditions(int(x), int(y))
+            return result
+
+        if self.game.profiler is not NULL_PROFILER:
+            self.game.profiler.evaluated(definition.name, int(mask.sum()))
+        return evaluator.mask(arrays["sun"], arrays["moisture"], arrays["sameNeighbors"],
+                              arrays["anyNeighbors"], turn, self.game.activeWeatherEvents)
+
+# Grids with fewer cells than this step in one process; the pool's round trip costs more
+PARALLEL_MIN_CELLS = 512*512
+# Tiles handed to each worker per turn, so uneven tiles even out across the pool
+PARALLEL_TILES_PER_WORKER = 4
+
+class SharedGrid:
+    """Dense gameState whose cells live in ParallelEngine's shared memory
+    block, so the pool steps the game's own cells in place.
+
+    Indexes like the bytearray it stands in for; slices are bytearray
+    copies. view is the cells as a memoryview; the STATE_TAIL bytes are kept
+    apart in tail, like ChunkedGrid's, so the game's views of them don't pin
+    the block.
+    """
+    def __init__(self, memory, gridDataSize):
+        self.view = memory.buf[:gridDataSize]
+        self.tail = bytearray(STATE_TAIL.size)
+
+    def __len__(self):
+        return len(self.view) + len(self.tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return (bytearray(self.view) + self.tail)[index]
+        if index < 0:
+            index += len(self)
+        if index >= len(self.view):
+            return self.tail[index - len(self.view)]
+        return self.view[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            if index != slice(None):
+                raise TypeError("SharedGrid only supports whole-grid slice assignment")
+            self.view[:] = memoryview(value)[:len(self.view)]
+            self.tail[:] = value[len(self.view):]
+            return
+        if index >= len(self.view):
+            self.tail[index - len(self.view)] = value
+            return
+        self.view[index] = value
+
+class ParallelEngine(VectorizedEngine):
+    """VectorizedEngine split across a pool of processes, for very large grids.
+
+    The grid is cut into bands of rows, and a persistent pool of worker
+    processes steps the bands in parallel; a turn is one round trip to the
+    pool. The game's state lives in a multiprocessing.shared_memory block
+    (see SharedGrid) that the workers write to directly, and each band
+    reports back which of its cells saturated or finished growing, so
+    nothing here walks the whole grid. Each band reads one halo row above
+    and below it to count neighbors, which is safe since plant types don't
+    change during a step. With the counter rng every worker draws its own
+    band's weather; other rngs' draws are made here once and shared. Either
+    way they are the draws the single-process step uses, so a seeded run
+    gives identical results.
+
+    Plants with hand-written conditions need the game itself, so workers
+    hand their cells back and they are checked here. Grids under
+    PARALLEL_MIN_CELLS take the single-process step.
+    """
+    def __init__(self, game, workers=None):
+        super().__init__(game)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.state = None
+
+    def start(self):
+        game = self.game
+        self.cells = shared_memory.SharedMemory(create=True, size=game.gridDataSize)
+        self.state = SharedGrid(self.cells, game.gridDataSize)
+        self.draws = None if game.rng.kind == "counter" else \
+            shared_memory.SharedMemory(create=True, size=2*game.cellCount*8)
+        self.pool = multiprocessing.Pool(self.workers, _init_tile_worker, (
+            self.cells.name, self.draws.name if self.draws is not None else None, game.width, game.height,
+            game.rng.kind, game.rng.seed, game.scenario))
+        self.finalizer = weakref.finalize(self, _stop_parallel_engine, self.pool, self.state, self.cells, self.draws)
+        rows = -(-game.height // (self.workers*PARALLEL_TILES_PER_WORKER))
+        self.tiles = [(top, min(top + rows, game.height)) for top in range(0, game.height, rows)]
+
+    def close(self):
+        """Stop the pool and free the shared memory; a later step starts them again."""
+        if self.pool is not None:
+            if self.game.gameState is self.state:
+                self.game.setGameState(self.state[:])
+            self.state = None
+            self.finalizer()
+            self.pool = None
+
+    def step(self, turn):
+        game = self.game
+        if game.cellCount < PARALLEL_MIN_CELLS:
+            return super().step(turn)
+        if self.pool is None:
+            self.start()
+        if game.gameState is not self.state:
+            # Loads and restores hand the game a new grid; move it into the shared block
+            self.state[:] = game.gameState
+            game.setGameState(self.state)
+
+        started = game.profiler.begin()
+        if self.draws is not None:
+            draws = np.ndarray((2*game.cellCount,), dtype=np.float64, buffer=self.draws.buf)
+            draws[...] = game.rng.weatherArray(turn, 2*game.cellCount)
+        game.profiler.end("weather", started)
+        started = game.profiler.begin()
+        sunChance = game.getCurrentSunChance()
+        game.recordSunChance(turn, sunChance)
+        counting = game.profiler is not NULL_PROFILER
+        jobs = [(turn, top, bottom, sunChance, game.getCurrentRainChance(), game.activeWeatherEvents, counting)
+                for top, bottom in self.tiles]
+        saturated, grown, unchecked = [], [], []
+        for evaluated, tileSaturated, tileGrown, tileUnchecked in self.pool.map(_step_tile, jobs, chunksize=1):
+            for name, count in evaluated.items():
+                game.profiler.evaluated(name, count)
+            saturated.extend(tileSaturated.tolist())
+            grown.extend(tileGrown.tolist())
+            unchecked.extend(tileUnchecked.tolist())
+
+        if game.cellSetsShared:
+            game.ownCellSets()
+        game.thirstyCells.difference_update(saturated)
+        state = game.gameState
+        maxGrowth = PlantRegistry.maxGrowth
+        for cell in unchecked:
+            y, x = divmod(cell, game.width)
+            if game.checkGrowthConditions(x, y):
+                cellIndex = cell*CELL_DATA_SIZE
+                state[cellIndex+3] += 1
+                if state[cellIndex+3] >= maxGrowth[state[cellIndex+2]]:
+                    grown.append(cell)
+        for cell in grown:
+            game.trackCell(cell)
+        game.profiler.end("growth", started)
+
+def _stop_parallel_engine(pool, grid, *memories):
+    pool.terminate()
+    # The block can only be closed once nothing views it
+    grid.view.release()
+    for memory in memories:
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+# What each ParallelEngine worker process steps its tiles with, set by _init_tile_worker
+_tileWorker = None
+
+def _init_tile_worker(cellsName, drawsName, width, height, rngKind, seed, scenario):
+    global _tileWorker
+    # Loads the scenario's crop packs in workers that didn't inherit them
+    compile_scenario(scenario)
+    cells = shared_memory.SharedMemory(name=cellsName)
+    draws = shared_memory.SharedMemory(name=drawsName) if drawsName else None
+    _tileWorker = {
+        # Kept so the mappings stay open
+        "memories": (cells, draws),
+        "cells": np.ndarray((height, width, CELL_DATA_SIZE), dtype=np.uint8, buffer=cells.buf),
+        "draws": np.ndarray((2*width*height,), dtype=np.float64, buffer=draws.buf) if draws else None,
+        "rng": make_rng(rngKind, seed),
+        "width": width,
+        "height": height,
+    }
+
+def _step_tile(job):
+    """Weather and growth for rows top..bottom-1, written straight to the shared grid.
+
+    Returns ({plant name: cells checked} when counting, cells that saturated
+    with rain, cells that finished growing, growable cells of plants with
+    hand-written conditions), cells as numbers over the whole grid.
+    """
+    turn, top, bottom, sunChance, rainChance, events, counting = job
+    worker = _tileWorker
+    width, height = worker["width"], worker["height"]
+    grid = worker["cells"]
+    rows = bottom - top
+    if worker["draws"] is not None:
+        draws = worker["draws"][2*top*width:2*bottom*width]
+    else:
+        draws = worker["rng"].weatherArray(turn, 2*rows*width, 2*top*width)
+    tile = grid[top:bottom]
+    cells = tile.astype(np.int32)
+    weather_cells(cells, draws.reshape(rows, width, 2), sunChance, rainChance)
+    first = top*width
+    saturated = np.flatnonzero((tile[:, :, 1] < 255) & (cells[:, :, 1] >= 255)) + first
+
+    plantType = cells[:, :, 2]
+    maxGrowth = np.frombuffer(PlantRegistry.maxGrowth, dtype=np.uint8)
+    growable = cells[:, :, 3] < maxGrowth[plantType]
+    evaluated = {}
+    grown = unchecked = np.zeros(0, dtype=np.intp)
+    if growable.any():
+        haloTop = max(top - 1, 0)
+        same, adjacent = neighbor_count_arrays(grid[haloTop:min(bottom + 1, height), :, 2])
+        same = same[top-haloTop:top-haloTop+rows]
+        adjacent = adjacent[top-haloTop:top-haloTop+rows]
+        grow = np.zeros_like(growable)
+        handWritten = []
+        for pt in np.unique(plantType[growable]):
+            definition = PlantRegistry.get_definition(int(pt))
+            if definition is None:
+                continue
+            mask = growable & (plantType == pt)
+            evaluator = definition.compile()
+            if evaluator is None:
+                handWritten.append(np.flatnonzero(mask))
+                continue
+            grow |= mask & evaluator.mask(cells[:, :, 0], cells[:, :, 1], same, adjacent, turn, events)
+            if counting:
+                evaluated[definition.name] = int(mask.sum())
+        cells[:, :, 3] += grow
+        grown = np.flatnonzero(grow & (cells[:, :, 3] >= maxGrowth[plantType])) + first
+        if handWritten:
+            unchecked = np.concatenate(handWritten) + first
+    tile[...] = cells
+    return evaluated, saturated, grown, unchecked
+
+def grid_size(scenario):
+    return tuple(scenario['startingConditions'].get('gridSize', (GRID_WIDTH, GRID_HEIGHT)))
+
+class GridChunk:
+    __slots__ = ("data", "plants")
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else array('B', bytes(CHUNK_SIZE*CHUNK_SIZE*CELL_DATA_SIZE))
+        self.plants = sum(1 for pt in self.data[2::CELL_DATA_SIZE] if pt != PlantType.NoneType)
+
+    def copy(self):
+        chunk = GridChunk.__new__(GridChunk)
+        chunk.data = array('B', self.data)
+        chunk.plants = self.plants
+        return chunk
+
+class ChunkedGrid:
+    """Sparse stand-in for the gameState buffer on very large grids.
+
+    Indexes exactly like the flat buffer (CELL_DATA_SIZE bytes per cell, then
+    the STATE_TAIL bytes), but cell data lives in CHUNK_SIZE x CHUNK_SIZE tiles of
+    array('B'). A tile is only allocated when something non-zero is written
+    to it; unallocated tiles read as zeros. Each tile counts its plants so
+    weather can skip tiles with none.
+
+    fork() copies a grid by sharing its tiles; either grid copies a shared
+    tile the first time it writes to it.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.gridDataSize = width*height*CELL_DATA_SIZE
+        self.chunks = {}
+        self.tail = bytearray(STATE_TAIL.size)
+        # Keys of tiles another grid may also hold, copied before they are written
+        self.shared = set()
+
+    def __len__(self):
+        return self.gridDataSize + len(self.tail)
+
+    def locate(self, index):
+        cell, field = divmod(index, CELL_DATA_SIZE)
+        y, x = divmod(cell, self.width)
+        cy, oy = divmod(y, CHUNK_SIZE)
+        cx, ox = divmod(x, CHUNK_SIZE)
+        return (cx, cy), (oy*CHUNK_SIZE + ox)*CELL_DATA_SIZE + field
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index == slice(None):
+                return self.copy()
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index >= self.gridDataSize:
+            return self.tail[index - self.gridDataSize]
+        key, offset = self.locate(index)
+        chunk = self.chunks.get(key)
+        return chunk.data[offset] if chunk is not None else 0
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            if index != slice(None) or not isinstance(value, ChunkedGrid):
+                raise TypeError("ChunkedGrid only supports whole-grid slice assignment")
+            self.chunks = {key: chunk.copy() for key, chunk in value.chunks.items()}
+            self.shared = set()
+            self.tail[:] = value.tail
+            return
+        if index >= self.gridDataSize:
+            self.tail[index - self.gridDataSize] = value
+            return
+        key, offset = self.locate(index)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if value == 0:
+                return
+            chunk = self.chunks[key] = GridChunk()
+        elif self.shared and key in self.shared:
+            if chunk.data[offset] == value:
+                return
+            chunk = self.chunks[key] = chunk.copy()
+            self.shared.discard(key)
+        if offset % CELL_DATA_SIZE == 2:
+            chunk.plants += (value != PlantType.NoneType) - (chunk.data[offset] != PlantType.NoneType)
+        chunk.data[offset] = value
+
+    def copy(self):
+        grid = ChunkedGrid(self.width, self.height)
+        grid[:] = self
+        return grid
+
+    def fork(self):
+        """A copy sharing this grid's tiles until either side writes to them."""
+        grid = ChunkedGrid(self.width, self.height)
+        grid.chunks = dict(self.chunks)
+        grid.tail[:] = self.tail
+        self.shared = set(self.chunks)
+        grid.shared = set(self.chunks)
+        return grid
+
+    def chunkCells(self, key):
+        """(offset in chunk, cell number) for every on-grid cell of a chunk."""
+        cx, cy = key
+        cells = []
+        for oy in range(CHUNK_SIZE):
+            y = cy*CHUNK_SIZE + oy
+            if y >= self.height:
+                break
+            for ox in range(CHUNK_SIZE):
+                x = cx*CHUNK_SIZE + ox
+                if x >= self.width:
+                    break
+                cells.append(((oy*CHUNK_SIZE + ox)*CELL_DATA_SIZE, y*self.width + x))
+        return cells
+
+    def changedIndices(self, other):
+        """Flat indices where this grid differs from other; only allocated chunks are compared."""
+        empty = array('B', bytes(CHUNK_SIZE*CHUNK_SIZE*CELL_DATA_SIZE))
+        indices = []
+        for key in self.chunks.keys() | other.chunks.keys():
+            mine = self.chunks[key].data if key in self.chunks else empty
+            theirs = other.chunks[key].data if key in other.chunks else empty
+            if mine is theirs or mine == theirs:
+                continue
+            for offset, cell in self.chunkCells(key):
+                for field in range(CELL_DATA_SIZE):
+                    if mine[offset+field] != theirs[offset+field]:
+                        indices.append(cell*CELL_DATA_SIZE + field)
+        for i, value in enumerate(self.tail):
+            if value != other.tail[i]:
+                indices.append(self.gridDataSize + i)
+        return indices
+
+class PagedGrid:
+    """Copy-on-write stand-in for a dense gameState, which forks switch to.
+
+    Indexes like the bytearray it stands in for, but holds the cells as
+    PAGE_SIZE-byte pages, with the STATE_TAIL bytes apart in tail like
+    ChunkedGrid's. fork() shares every page; either grid copies a page the
+    first time it writes to it. Slices are bytearray copies, so [:] gives
+    back a flat state.
+    """
+    def __init__(self, state):
+        """Pages over a flat state, which is taken over rather than copied: don't write to it afterwards."""
+        self.gridDataSize = len(state) - STATE_TAIL.size
+        cells = memoryview(state).toreadonly()[:self.gridDataSize]
+        self.pages = [cells[start:start+PAGE_SIZE] for start in range(0, self.gridDataSize, PAGE_SIZE)]
+        self.tail = bytearray(state[self.gridDataSize:])
+        # Pages another grid may also hold, copied before they are written
+        self.shared = set(range(len(self.pages)))
+
+    def __len__(self):
+        return self.gridDataSize + len(self.tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            state = bytearray().join(self.pages)
+            state += self.tail
+            return state if index == slice(None) else state[index]
+        if index < 0:
+            index += len(self)
+        if index >= self.gridDataSize:
+            return self.tail[index - self.gridDataSize]
+        page, offset = divmod(index, PAGE_SIZE)
+        return self.pages[page][offset]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            if index != slice(None):
+                raise TypeError("PagedGrid only supports whole-grid slice assignment")
+            cells = memoryview(value)[:self.gridDataSize]
+            self.pages = [bytearray(cells[start:start+PAGE_SIZE]) for start in range(0, self.gridDataSize, PAGE_SIZE)]
+            self.shared = set()
+            self.tail[:] = value[self.gridDataSize:]
+            return
+        if index >= self.gridDataSize:
+            self.tail[index - self.gridDataSize] = value
+            return
+        page, offset = divmod(index, PAGE_SIZE)
+        if self.shared and page in self.shared:
+            if self.pages[page][offset] == value:
+                return
+            self.pages[page] = bytearray(self.pages[page])
+            self.shared.discard(page)
+        self.pages[page][offset] = value
+
+    def fork(self):
+        """A copy sharing this grid's pages until either side writes to them."""
+        grid = PagedGrid.__new__(PagedGrid)
+        grid.gridDataSize = self.gridDataSize
+        grid.pages = list(self.pages)
+        grid.tail = bytearray(self.tail)
+        self.shared = set(range(len(self.pages)))
+        grid.shared = set(self.shared)
+        return grid
+
+    def changedIndices(self, other):
+        """Flat indices where this grid differs from another PagedGrid; shared pages are skipped."""
+        indices = []
+        for page, (mine, theirs) in enumerate(zip(self.pages, other.pages)):
+            if mine is theirs or mine == theirs:
+                continue
+            start = page*PAGE_SIZE
+            if np is not None:
+                changed = np.flatnonzero(np.frombuffer(mine, dtype=np.uint8) != np.frombuffer(theirs, dtype=np.uint8))
+                indices.extend((changed + start).tolist())
+            else:
+                indices.extend(start + offset for offset in range(len(mine)) if mine[offset] != theirs[offset])
+        for i, value in enumerate(self.tail):
+            if value != other.tail[i]:
+                indices.append(self.gridDataSize + i)
+        return indices
+
+# State hashes XOR one key per (offset, value) for every non-zero byte, so a
+# changed byte updates the hash in O(1). Sun is left out: it is the turn's
+# weather draw, and only growing plants keep it current (see Game.cellSuns).
+ZOBRIST_SEED = 0x2545F4914F6CDD1D
+# Diffs at least this long are hashed with NumPy when it is available
+ZOBRIST_ARRAY_MIN = 64
+
+def _zobrist(index, value):
+    return _splitmix64(ZOBRIST_SEED ^ (index << 8 | value)) if value else 0
+
+def zobrist_hash(state):
+    """64-bit hash of a dense or chunked state, from scratch."""
+    gridDataSize = len(state) - STATE_TAIL.size
+    h = 0
+    if isinstance(state, ChunkedGrid):
+        for key, chunk in state.chunks.items():
+            data = chunk.data
+            for offset, cell in state.chunkCells(key):
+                for field in range(1, CELL_DATA_SIZE):
+                    h ^= _zobrist(cell*CELL_DATA_SIZE + field, data[offset+field])
+        cells = []
+    else:
+        cells = state[:gridDataSize]
+    for i, value in enumerate(cells):
+        if value and i % CELL_DATA_SIZE:
+            h ^= _zobrist(i, value)
+    for i in range(STATE_TAIL.size):
+        h ^= _zobrist(gridDataSize + i, state[gridDataSize + i])
+    return h
+
+def _zobrist_array(indices, values):
+    """XOR of _zobrist over arrays of indices and values."""
+    x = np.uint64(ZOBRIST_SEED) ^ ((indices.astype(np.uint64) << np.uint64(8)) | values.astype(np.uint64))
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return int(np.bitwise_xor.reduce(x[values != 0], initial=np.uint64(0)))
+
+def zobrist_update(h, indices, oldValues, newValues, gridDataSize):
+    """h after the bytes at indices change from oldValues to newValues."""
+    if np is not None and len(indices) >= ZOBRIST_ARRAY_MIN:
+        indices = np.frombuffer(indices, dtype=np.uint32)
+        hashed = (indices >= gridDataSize) | (indices % CELL_DATA_SIZE != 0)
+        indices = indices[hashed]
+        return (h ^ _zobrist_array(indices, np.frombuffer(oldValues, dtype=np.uint8)[hashed])
+                  ^ _zobrist_array(indices, np.frombuffer(newValues, dtype=np.uint8)[hashed]))
+    for i, old, new in zip(indices, oldValues, newValues):
+        if i >= gridDataSize or i % CELL_DATA_SIZE:
+            h ^= _zobrist(i, old) ^ _zobrist(i, new)
+    return h
+
+class HistoryEntry:
+    __slots__ = ("keyframe", "indices", "oldValues", "newValues", "hash")
+
+    def __init__(self, keyframe=None, indices=None, oldValues=None, newValues=None, hash=None):
+        self.keyframe = keyframe
+        self.indices = indices
+        self.oldValues = oldValues
+        self.newValues = newValues
+        # zobrist_hash of the state after this entry
+        self.hash = hash
+
+def fork_state(state):
+    """A copy of a gameState; chunked and paged grids share their tiles and pages copy-on-write."""
+    if isinstance(state, (ChunkedGrid, PagedGrid)):
+        return state.fork()
+    return state[:] if state is not None else None
+
+def changed_indices(state, last):
+    """array('I') of the offsets where state differs from last."""
+    if isinstance(state, ChunkedGrid):
+        return array('I', state.changedIndices(last))
+    if isinstance(state, PagedGrid) and isinstance(last, PagedGrid):
+        return array('I', state.changedIndices(last))
+    # Shared and paged grids keep their tail apart; compare flat copies of them
+    if isinstance(state, (SharedGrid, PagedGrid)):
+        state = state[:]
+    if isinstance(last, (SharedGrid, PagedGrid)):
+        last = last[:]
+    if state == last:
+        return array('I')
+    if np is not None:
+        changed = np.flatnonzero(np.frombuffer(state, dtype=np.uint8) != np.frombuffer(last, dtype=np.uint8))
+        return array('I', changed.astype(np.uint32).tobytes())
+    return array('I', [i for i in range(len(state)) if state[i] != last[i]])
+
+class History:
+    """Undo/redo stack that stores what changed between states.
+
+    Each entry is either a diff against the previous state (changed indices
+    with old and new values) or a full keyframe. The oldest entry is always a
+    keyframe, a keyframe is forced every keyframeInterval entries, and a diff
+    that would be bigger than a snapshot is stored as a keyframe instead.
+    Up to depth steps can be undone.
+
+    Pushed entries are also queued in pending as (entries before the push,
+    entry) pairs until a save journal drains them; pending becomes None if
+    nobody drained it for a full depth of pushes.
+
+    hash is the zobrist_hash of last, kept up to date from each diff.
+    """
+    def __init__(self, depth=HISTORY_DEPTH, keyframeInterval=HISTORY_KEYFRAME_INTERVAL):
+        self.depth = depth
+        self.keyframeInterval = keyframeInterval
+        self.entries = deque()
+        self.future = []
+        self.last = None
+        self.hash = 0
+        self.sinceKeyframe = 0
+        self.pending = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, state):
+        last = self.last
+        if last is None:
+            self.append(HistoryEntry(keyframe=state[:]))
+            return
+        if isinstance(last, PagedGrid) and not isinstance(state, PagedGrid):
+            # Once state is flat again, so is last, rather than flattening it for every diff
+            last = self.last = last[:]
+
+        indices = changed_indices(state, last)
+        oldValues = array('B', [last[i] for i in indices])
+        newValues = array('B', [state[i] for i in indices])
+        stateHash = zobrist_update(self.hash, indices, oldValues, newValues, len(state) - STATE_TAIL.size)
+        # Each changed byte costs a uint32 index plus its old and new value
+        if self.sinceKeyframe + 1 >= self.keyframeInterval or len(indices)*(indices.itemsize+2) > len(state):
+            entry = HistoryEntry(keyframe=state[:], hash=stateHash)
+        else:
+            entry = HistoryEntry(indices=indices, oldValues=oldValues, newValues=newValues, hash=stateHash)
+        self.append(entry)
+
+    def append(self, entry):
+        """Record an already-built entry on top of the current one."""
+        self.future = []
+        if entry.keyframe is not None:
+            if entry.hash is None:
+                entry.hash = zobrist_hash(entry.keyframe)
+            self.last = entry.keyframe[:]
+            self.sinceKeyframe = 0
+        else:
+            if entry.hash is None:
+                entry.hash = zobrist_update(self.hash, entry.indices, entry.oldValues, entry.newValues,
+                                            len(self.last) - STATE_TAIL.size)
+            for i, value in zip(entry.indices, entry.newValues):
+                self.last[i] = value
+            self.sinceKeyframe += 1
+        self.hash = entry.hash
+
+        if self.pending is not None:
+            self.pending.append((len(self.entries), entry))
+            if len(self.pending) > self.depth + 1:
+                self.pending = None
+        self.entries.append(entry)
+
+        if len(self.entries) > self.depth + 1:
+            evicted = self.entries.popleft()
+            base = self.entries[0]
+            if base.keyframe is None:
+                state = evicted.keyframe[:]
+                for i, value in zip(base.indices, base.newValues):
+                    state[i] = value
+                self.entries[0] = HistoryEntry(keyframe=state, hash=base.hash)
+
+    def undo(self, state, write=None):
+        """Step state back one entry in place. Returns False if there is nothing to undo.
+
+        write(indices, values), when given, does the writing instead (the
+        game's applyChanges, to keep its cell indexes in step); a keyframe
+        then goes through it as its difference from state.
+        """
+        if len(self.entries) <= 1:
+            return False
+        entry = self.entries.pop()
+        self.future.append(entry)
+        if entry.keyframe is None:
+            self.write(state, entry.indices, entry.oldValues, write)
+        else:
+            self.overwrite(state, self.materialize(len(self.entries)-1), write)
+        self.last = state[:]
+        self.hash = self.entries[-1].hash
+        self.sinceKeyframe = self.entriesSinceKeyframe()
+        return True
+
+    def redo(self, state, write=None):
+        """Re-apply the last undone entry to state in place. Returns False if there is none.
+        write is as for undo."""
+        if len(self.future) == 0:
+            return False
+        entry = self.future.pop()
+        self.entries.append(entry)
+        if entry.keyframe is None:
+            self.write(state, entry.indices, entry.newValues, write)
+        else:
+            self.overwrite(state, entry.keyframe, write)
+        self.last = state[:]
+        self.hash = entry.hash
+        self.sinceKeyframe = self.entriesSinceKeyframe()
+        return True
+
+    @staticmethod
+    def write(state, indices, values, write):
+        if write is not None:
+            write(indices, values)
+            return
+        for i, value in zip(indices, values):
+            state[i] = value
+
+    @staticmethod
+    def overwrite(state, target, write):
+        if write is None:
+            state[:] = target
+            return
+        indices = changed_indices(target, state)
+        write(indices, array('B', [target[i] for i in indices]))
+
+    def entriesSinceKeyframe(self):
+        count = 0
+        for entry in reversed(self.entries):
+            if entry.keyframe is not None:
+                break
+            count += 1
+        return count
+
+    def materialize(self, index):
+        """Full copy of the state recorded at entries[index]."""
+        start = index
+        while self.entries[start].keyframe is None:
+            start -= 1
+        state = self.entries[start].keyframe[:]
+        for k in range(start+1, index+1):
+            entry = self.entries[k]
+            for i, value in zip(entry.indices, entry.newValues):
+                state[i] = value
+        return state
+
+    def snapshots(self):
+        """Every recorded state, oldest first."""
+        state = None
+        for entry in self.entries:
+            if entry.keyframe is not None:
+                state = entry.keyframe[:]
+            else:
+                state = state[:]
+                for i, value in zip(entry.indices, entry.newValues):
+                    state[i] = value
+            yield state
+
+    def fork(self):
+        """A copy sharing this history's entries, which are never modified once pushed."""
+        history = History(self.depth, self.keyframeInterval)
+        history.entries = deque(self.entries)
+        history.future = list(self.future)
+        if isinstance(self.last, bytearray):
+            # Both histories page last from here on, so the fork copies none of it
+            self.last = PagedGrid(self.last)
+        history.last = fork_state(self.last)
+        history.hash = self.hash
+        history.sinceKeyframe = self.sinceKeyframe
+        # Nothing journals a fork
+        history.pending = None
+        return history
+
+    def drainPending(self):
+        pending = self.pending
+        self.pending = []
+        return pending
+
+    def truncate(self, length):
+        while len(self.entries) > length:
+            self.entries.pop()
+        self.last = self.materialize(len(self.entries)-1) if self.entries else None
+        self.hash = self.entries[-1].hash if self.entries else 0
+        self.sinceKeyframe = self.entriesSinceKeyframe()
+
+    @classmethod
+    def fromSnapshots(cls, snapshots, depth=HISTORY_DEPTH):
+        history = cls(depth)
+        for snapshot in snapshots:
+            history.push(snapshot)
+        return history
+
+def _le_bytes(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _le_array(typecode, buffer):
+    values = array(typecode)
+    values.frombytes(buffer)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+def _le_tail(tail):
+    if sys.byteorder == "little":
+        return bytes(tail)
+    return SAVE_TAIL.pack(*STATE_TAIL.unpack(tail))
+
+def pack_state(state, gridDataSize):
+    if isinstance(state, ChunkedGrid):
+        chunks = [SAVE_CHUNK_KEY.pack(*key) + chunk.data.tobytes() for key, chunk in state.chunks.items()]
+        grid = struct.pack("<I", len(chunks)) + b"".join(chunks)
+        return grid + _le_tail(state.tail)
+    return bytes(state[:gridDataSize]) + _le_tail(state[gridDataSize:])
+
+def unpack_state(buffer, offset, width, height, chunked=False):
+    gridDataSize = width*height*CELL_DATA_SIZE
+    if chunked:
+        state = ChunkedGrid(width, height)
+        (count,) = struct.unpack_from("<I", buffer, offset)
+        offset += 4
+        chunkBytes = CHUNK_SIZE*CHUNK_SIZE*CELL_DATA_SIZE
+        for _ in range(count):
+            key = SAVE_CHUNK_KEY.unpack_from(buffer, offset)
+            offset += SAVE_CHUNK_KEY.size
+            state.chunks[key] = GridChunk(array('B', buffer[offset:offset+chunkBytes]))
+            offset += chunkBytes
+        state.tail[:] = STATE_TAIL.pack(*SAVE_TAIL.unpack_from(buffer, offset))
+        return state, offset + SAVE_TAIL.size
+    state = bytearray(buffer[offset:offset+gridDataSize])
+    state += STATE_TAIL.pack(*SAVE_TAIL.unpack_from(buffer, offset+gridDataSize))
+    return state, offset + gridDataSize + SAVE_TAIL.size
+
+def encode_history_entry(entry, gridDataSize):
+    if entry.keyframe is not None:
+        kind = SAVE_CHUNKED_KEYFRAME if isinstance(entry.keyframe, ChunkedGrid) else SAVE_KEYFRAME
+        return bytes([kind]) + pack_state(entry.keyframe, gridDataSize)
+    return b"".join([
+        bytes([SAVE_DIFF]),
+        struct.pack("<I", len(entry.indices)),
+        _le_bytes(entry.indices),
+        entry.oldValues.tobytes(),
+        entry.newValues.tobytes(),
+    ])
+
+def decode_history_entry(buffer, offset, width, height, plantMap=None):
+    """plantMap is a plant_id_map() to translate the entry's plant IDs with."""
+    kind = buffer[offset]
+    offset += 1
+    if kind in (SAVE_KEYFRAME, SAVE_CHUNKED_KEYFRAME):
+        state, offset = unpack_state(buffer, offset, width, height, kind == SAVE_CHUNKED_KEYFRAME)
+        if plantMap is not None:
+            remap_plants(state, plantMap)
+        return HistoryEntry(keyframe=state), offset
+    (count,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    size = 4*count
+    entry = HistoryEntry(
+        indices=_le_array('I', buffer[offset:offset+size]),
+        oldValues=array('B', buffer[offset+size:offset+size+count]),
+        newValues=array('B', buffer[offset+size+count:offset+size+2*count]),
+    )
+    if plantMap is not None:
+        gridDataSize = width*height*CELL_DATA_SIZE
+        for k, index in enumerate(entry.indices):
+            if index < gridDataSize and index % CELL_DATA_SIZE == 2:
+                entry.oldValues[k] = plantMap[entry.oldValues[k]]
+                entry.newValues[k] = plantMap[entry.newValues[k]]
+    return entry, offset + size + 2*count
+
+def _map_file(path):
+    """Read-only memoryview over a file, or None if it is missing or empty."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def write_file_atomic(path, chunks):
+    """Write to a temp file and swap it in, so path is never left half-written."""
+    tmpPath = f"{path}.tmp"
+    with open(tmpPath, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpPath, path)
+
+def encode_sun_chances(sunChances):
+    """A uint32 count and a SUN_CHANCE record per turn; None (a removed turn) is stored as NaN."""
+    return struct.pack("<I", len(sunChances)) + b"".join(
+        SUN_CHANCE.pack(turn, math.nan if chance is None else chance) for turn, chance in sunChances.items())
+
+def decode_sun_chances(buffer, offset):
+    (count,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    sunChances = {}
+    for turn, chance in SUN_CHANCE.iter_unpack(buffer[offset:offset + count*SUN_CHANCE.size]):
+        sunChances[turn] = None if math.isnan(chance) else chance
+    return sunChances, offset + count*SUN_CHANCE.size
+
+def encode_rng(rng):
+    return SAVE_RNG.pack(rng.kind.encode(), rng.seed & MASK64) if rng is not None else SAVE_RNG.pack(b"", 0)
+
+def decode_rng(buffer, offset):
+    """The rng packed at offset, or None if the save didn't record one."""
+    kind, seed = SAVE_RNG.unpack_from(buffer, offset)
+    kind = kind.rstrip(b"\0").decode()
+    return make_rng(kind, seed) if kind in RNG_KINDS else None
+
+class SaveError(ValueError):
+    pass
+
+def plant_names():
+    """Crop name of each plant ID from 1 up, which saves keep to map their IDs back to this session's."""
+    return [definition.name for definition in PlantRegistry.definitions[1:]]
+
+def encode_plant_names(names):
+    """A uint16 count, then each name as a uint16 length and UTF-8."""
+    encoded = [name.encode() for name in names]
+    return struct.pack("<H", len(encoded)) + b"".join(struct.pack("<H", len(name)) + name for name in encoded)
+
+def decode_plant_names(buffer, offset):
+    (count,) = struct.unpack_from("<H", buffer, offset)
+    offset += 2
+    names = []
+    for _ in range(count):
+        (length,) = struct.unpack_from("<H", buffer, offset)
+        names.append(bytes(buffer[offset+2:offset+2+length]).decode())
+        offset += 2 + length
+    return names, offset
+
+def plant_id_map(names):
+    """bytes.translate table from the plant IDs of a save with these plant_names()
+    to this session's, or None if they are the same (or the save predates the names).
+    Raises SaveError if one of its crops isn't loaded."""
+    if names is None:
+        return None
+    table = bytearray(range(MAX_PLANT_TYPES))
+    for plantType, name in enumerate(names, 1):
+        current = PlantRegistry.ids.get(name.lower())
+        if current is None:
+            raise SaveError(f"The save has {name!r} plants, which no loaded crop pack defines")
+        table[plantType] = current
+    return bytes(table) if table != bytes(range(MAX_PLANT_TYPES)) else None
+
+def remap_plants(state, plantMap):
+    """Translate the plant IDs of a dense or chunked gameState in place."""
+    if isinstance(state, ChunkedGrid):
+        for chunk in state.chunks.values():
+            chunk.data[2::CELL_DATA_SIZE] = array('B', chunk.data[2::CELL_DATA_SIZE].tobytes().translate(plantMap))
+        return
+    gridDataSize = len(state) - STATE_TAIL.size
+    state[2:gridDataSize:CELL_DATA_SIZE] = state[2:gridDataSize:CELL_DATA_SIZE].translate(plantMap)
+
+def write_save_file(path, entries, reaped, width, height, generation=0, sunChances=None, rng=None, plants=None):
+    """plants is the plant_names() the entries' IDs go by, the current ones by default."""
+    entries = list(entries)
+    header = SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, width, height, generation, reaped, len(entries)) + encode_rng(rng)
+    header += encode_plant_names(plant_names() if plants is None else plants)
+    gridDataSize = width*height*CELL_DATA_SIZE
+    write_file_atomic(path, [header] + [encode_history_entry(entry, gridDataSize) for entry in entries] +
+                      [encode_sun_chances(sunChances or {})])
+
+def read_save_file(path, width, height, depth=HISTORY_DEPTH):
+    """Returns (history, reaped, generation, sunChances, rng, plants), or None if path is not a usable
+    save for a width x height grid. The entries' plant IDs are mapped to this session's;
+    plants is the plant_names() they were saved with. rng is None for saves from before
+    version 4 and plants for those from before version 5."""
+    buffer = _map_file(path)
+    if buffer is None or len(buffer) < SAVE_HEADER.size:
+        return None
+    magic, version, saveWidth, saveHeight, generation, reaped, count = SAVE_HEADER.unpack_from(buffer, 0)
+    if magic != SAVE_MAGIC or version not in SAVE_READ_VERSIONS or (saveWidth, saveHeight) != (width, height):
+        return None
+    history = History(depth)
+    offset = SAVE_HEADER.size
+    rng = plants = None
+    if version >= 4:
+        rng = decode_rng(buffer, offset)
+        offset += SAVE_RNG.size
+    if version >= 5:
+        plants, offset = decode_plant_names(buffer, offset)
+    plantMap = plant_id_map(plants)
+    for _ in range(count):
+        entry, offset = decode_history_entry(buffer, offset, width, height, plantMap)
+        history.append(entry)
+    history.drainPending()
+    sunChances = decode_sun_chances(buffer, offset)[0] if version >= 3 else {}
+    return history, reaped, generation, sunChances, rng, plants
+
+class AutoSaveWriter:
+    """Runs save jobs on a background thread.
+
+    Each job comes with the write function that handles it. Jobs submitted
+    while the thread is busy, or within coalesceSeconds of each other, are
+    handed to their write function together so a burst of commands becomes
+    one write; one writer can serve many journals. A write that raises is
+    reported on stderr, which unlike the games' renderers is safe to use
+    from this thread, and the writer carries on with the next one.
+    """
+    def __init__(self, coalesceSeconds=AUTOSAVE_COALESCE_SECONDS):
+        self.coalesceSeconds = coalesceSeconds
+        self.jobs = []
+        self.busy = False
+        self.flushing = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def submit(self, write, job):
+        with self.condition:
+            self.jobs.append((write, job))
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                # Each submit() notifies, so wait out the whole window rather than one wakeup
+                deadline = time.monotonic() + self.coalesceSeconds
+                while not self.flushing:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self.condition.wait(left)
+                jobs = self.jobs
+                self.jobs = []
+                self.busy = True
+            batches = {}
+            for write, job in jobs:
+                batches.setdefault(write, []).append(job)
+            try:
+                for write, batch in batches.items():
+                    try:
+                        write(batch)
+                    except Exception as e:
+                        print(f"Autosave failed: {e!r}", file=sys.stderr)
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def flush(self):
+        """Block until every submitted job has been written."""
+        with self.condition:
+            self.flushing = True
+            self.condition.notify_all()
+            while self.jobs or self.busy:
+                self.condition.wait()
+            self.flushing = False
+
+class SaveJournal:
+    """A binary save plus an append-only journal of the entries pushed since.
+
+    record() appends new history entries to name.journal and only rewrites
+    name.bin when the journal has grown past compactEvery records, or on the
+    first save of a session. The two files share a generation number so a
+    journal left over from an older save is ignored. The game's rng and
+    recorded sun chances (Game.eventSunChances) go in the save, and changes
+    to the sun chances in JOURNAL_SUN_CHANCES records. Journal records use
+    the plant IDs of their save, so a change to plant_names() compacts.
+
+    record() only snapshots what to write (history entries are never
+    modified once pushed); with background=True the encoding and disk I/O
+    happen on an AutoSaveWriter thread, which can be shared between
+    journals by passing it as writer.
+    """
+    def __init__(self, name, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 compactEvery=JOURNAL_COMPACT_RECORDS, background=False, writer=None):
+        self.savePath = f"{name}.bin"
+        self.width = width
+        self.height = height
+        self.journalPath = f"{name}.journal"
+        self.compactEvery = compactEvery
+        self.generation = None
+        self.records = 0
+        # The sun chances as of the last record, to journal just what changed
+        self.sunChances = {}
+        # plant_names() of the save the journal follows
+        self.plants = None
+        self.writer = writer or (AutoSaveWriter() if background else None)
+
+    def exists(self):
+        return os.path.exists(self.savePath)
+
+    def record(self, history, reaped, sunChances=None, rng=None):
+        pending = history.drainPending()
+        sunChances = sunChances or {}
+        changes = {}
+        if sunChances != self.sunChances:
+            changes = {turn: chance for turn, chance in sunChances.items() if self.sunChances.get(turn) != chance}
+            changes.update((turn, None) for turn in self.sunChances.keys() - sunChances.keys())
+        records = (len(pending) if pending is not None else 0) + bool(changes)
+        plants = plant_names()
+        if self.generation is None or pending is None or self.records + records > self.compactEvery or plants != self.plants:
+            self.generation = int.from_bytes(os.urandom(4), "little")
+            self.records = 0
+            self.sunChances = dict(sunChances)
+            self.plants = plants
+            self.submit(("compact", list(history.entries), reaped, self.generation, self.sunChances, rng, plants))
+        elif records:
+            self.records += records
+            self.sunChances = dict(sunChances)
+            self.submit(("append", pending, reaped, changes))
+
+    def submit(self, job):
+        if self.writer is not None:
+            self.writer.submit(self.write, job)
+        else:
+            self.write([job])
+
+    def write(self, jobs):
+        try:
+            self.writeJobs(jobs)
+        except Exception:
+            # Whatever made it to disk, start over with a full save on the next record
+            self.generation = None
+            raise
+
+    def writeJobs(self, jobs):
+        # A compaction contains everything queued before it
+        for i in range(len(jobs)-1, -1, -1):
+            if jobs[i][0] == "compact":
+                _, entries, reaped, generation, sunChances, rng, plants = jobs[i]
+                write_save_file(self.savePath, entries, reaped, self.width, self.height, generation, sunChances, rng, plants)
+                write_file_atomic(self.journalPath, [JOURNAL_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, generation),
+                                                     encode_rng(rng)])
+                jobs = jobs[i+1:]
+                break
+
+        records = []
+        for _, pending, reaped, changes in jobs:
+            if changes:
+                payload = encode_sun_chances(changes)
+                records.append(JOURNAL_RECORD.pack(len(payload), JOURNAL_SUN_CHANCES, reaped) + payload)
+            for base, entry in pending:
+                payload = encode_history_entry(entry, self.width*self.height*CELL_DATA_SIZE)
+                records.append(JOURNAL_RECORD.pack(len(payload), base, reaped) + payload)
+        if records:
+            with open(self.journalPath, "ab") as f:
+                f.write(b"".join(records))
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def load(self, depth=HISTORY_DEPTH):
+        """Returns (history, reaped, sunChances, rng) with the journal replayed, or None."""
+        self.flush()
+        loaded = read_save_file(self.savePath, self.width, self.height, depth)
+        if loaded is None:
+            return None
+        history, reaped, generation, sunChances, rng, plants = loaded
+        self.generation = generation
+        self.records = 0
+        self.sunChances = sunChances
+        self.plants = plants
+
+        buffer = _map_file(self.journalPath)
+        offset = JOURNAL_HEADER.size
+        valid = buffer is not None and len(buffer) >= offset
+        if valid:
+            magic, version, journalGeneration = JOURNAL_HEADER.unpack_from(buffer, 0)
+            valid = magic == SAVE_MAGIC and version in SAVE_READ_VERSIONS and journalGeneration == generation
+            if valid and version >= 4:
+                valid = bytes(buffer[offset:offset+SAVE_RNG.size]) == encode_rng(rng)
+                offset += SAVE_RNG.size
+        if not valid:
+            # Whatever is there isn't this save's journal; start a new one on the next record
+            # rather than append to it
+            self.generation = None
+            return history, reaped, dict(sunChances), rng
+
+        plantMap = plant_id_map(plants)
+        end = len(buffer)
+        while offset + JOURNAL_RECORD.size <= end:
+            length, base, recordReaped = JOURNAL_RECORD.unpack_from(buffer, offset)
+            if offset + JOURNAL_RECORD.size + length > end:
+                break  # torn write at the end of the journal
+            offset += JOURNAL_RECORD.size
+            if base == JOURNAL_SUN_CHANCES:
+                for turn, chance in decode_sun_chances(buffer, offset)[0].items():
+                    if chance is None:
+                        sunChances.pop(turn, None)
+                    else:
+                        sunChances[turn] = chance
+                offset += length
+                self.records += 1
+                continue
+            entry, _ = decode_history_entry(buffer, offset, self.width, self.height, plantMap)
+            offset += length
+            if base < len(history):
+                history.truncate(base)
+            history.append(entry)
+            reaped = recordReaped
+            self.records += 1
+        del buffer
+        if offset < end:
+            # Cut off a torn last record, or later appends would land after it and never be read
+            os.truncate(self.journalPath, offset)
+        history.drainPending()
+        return history, reaped, dict(sunChances), rng
+
+def _block_digest(data):
+    return hashlib.blake2b(data, digest_size=STORE_DIGEST_SIZE).digest()
+
+def _manifest_entries(manifest):
+    """The block digests of each entry in a slot manifest: a uint32 count, then the digests."""
+    offset = 0
+    while offset < len(manifest):
+        (count,) = struct.unpack_from("<I", manifest, offset)
+        offset += 4
+        yield [bytes(manifest[offset + k*STORE_DIGEST_SIZE:offset + (k+1)*STORE_DIGEST_SIZE]) for k in range(count)]
+        offset += count*STORE_DIGEST_SIZE
+
+class SaveStoreError(SaveError):
+    pass
+
+class SaveStore:
+    """Named save slots in one directory, sharing their data as content-addressed blocks.
+
+    Each history entry is encoded as in a save file and cut into blocks of
+    up to STORE_BLOCK_SIZE bytes, named by their hash. A block is written
+    once however many slots or entries contain it, so slots saved along one
+    run share everything but the entries pushed in between. The files:
+    - blocks.pack: block data back to back, only ever appended to
+    - blocks.idx: a STORE_BLOCK record locating each block in blocks.pack
+    - index.json: each slot's grid size, turn, reaped count, save time,
+      rng kind and seed, plant_names(), recorded sun chances and the digest
+      of its manifest, a block listing its entries' blocks
+    Listing slots reads only index.json, and loading one reads only the
+    index, its manifest and its blocks. index.json is replaced last, so a
+    save cut short leaves the slots as they were plus some unused blocks;
+    collect() drops those and the blocks of deleted or overwritten slots.
+    Other stores on the same directory (a forked game's) may collect or
+    save too, so refresh() notices when blocks.idx has been rewritten.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.packPath = os.path.join(directory, "blocks.pack")
+        self.indexPath = os.path.join(directory, "blocks.idx")
+        self.slotsPath = os.path.join(directory, "index.json")
+        # digest -> (offset, length) of every block read from blocks.idx so far
+        self.blocks = {}
+        self.indexRead = 0
+        # blocks.idx's (device, inode) and last record read, to tell appends from a rewrite
+        self.indexFile = None
+        self.indexTail = b""
+        # id(entry) -> (entry, its block digests) for the entries of the last save,
+        # so saving the same history again only encodes its new entries
+        self.entryBlocks = {}
+
+    def refresh(self):
+        """Pick up blocks.idx records appended since the last look, or reread it if it was rewritten."""
+        self.recover()
+        buffer = _map_file(self.indexPath)
+        if buffer is None:
+            self.forget()
+            return
+        stat = os.stat(self.indexPath)
+        if (stat.st_dev, stat.st_ino) != self.indexFile or len(buffer) < self.indexRead or \
+                bytes(buffer[self.indexRead-len(self.indexTail):self.indexRead]) != self.indexTail:
+            self.forget()
+            self.indexFile = (stat.st_dev, stat.st_ino)
+        packSize = os.path.getsize(self.packPath) if os.path.exists(self.packPath) else 0
+        end = len(buffer) - len(buffer) % STORE_BLOCK.size
+        for digest, offset, length in STORE_BLOCK.iter_unpack(buffer[self.indexRead:end]):
+            if offset + length <= packSize:
+                self.blocks[digest] = (offset, length)
+        if end > self.indexRead:
+            self.indexTail = bytes(buffer[end-STORE_BLOCK.size:end])
+        self.indexRead = end
+
+    def forget(self):
+        # The entries cached from the last save may use blocks that are gone now
+        self.blocks, self.indexRead = {}, 0
+        self.indexFile, self.indexTail = None, b""
+        self.entryBlocks = {}
+
+    def slots(self):
+        """{name: {width, height, turn, reaped, entries, saved, manifest, rng, seed, plants, sunChances}} of every slot."""
+        try:
+            with open(self.slotsPath, "r") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return index["slots"] if index.get("version") == STORE_VERSION else {}
+
+    def save(self, name, entries, reaped, width, height, turn, sunChances=None, rng=None):
+        """Store entries as slot name, replacing any slot of that name."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.refresh()
+        gridDataSize = width*height*CELL_DATA_SIZE
+        new = {}
+        entryBlocks = {}
+        manifest = []
+
+        def put(data):
+            digest = _block_digest(data)
+            if digest not in self.blocks and digest not in new:
+                new[digest] = data
+            return digest
+
+        for entry in entries:
+            known = self.entryBlocks.get(id(entry))
+            if known is not None and known[0] is entry:
+                digests = known[1]
+            else:
+                data = encode_history_entry(entry, gridDataSize)
+                digests = [put(data[i:i+STORE_BLOCK_SIZE]) for i in range(0, len(data), STORE_BLOCK_SIZE)]
+            entryBlocks[id(entry)] = (entry, digests)
+            manifest.append(struct.pack("<I", len(digests)))
+            manifest.extend(digests)
+        manifestDigest = put(b"".join(manifest))
+
+        if new:
+            with open(self.packPath, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                records = []
+                for digest, data in new.items():
+                    records.append(STORE_BLOCK.pack(digest, offset, len(data)))
+                    offset += len(data)
+                f.write(b"".join(new.values()))
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.indexPath, "ab") as f:
+                f.write(b"".join(records))
+                f.flush()
+                os.fsync(f.fileno())
+            self.refresh()
+        self.entryBlocks = entryBlocks
+
+        slots = self.slots()
+        slots[name] = {"width": width, "height": height, "turn": turn, "reaped": reaped,
+                       "entries": len(entryBlocks), "saved": time.time(), "manifest": manifestDigest.hex(),
+                       "rng": rng.kind if rng is not None else None, "seed": rng.seed if rng is not None else None,
+                       "plants": plant_names(),
+                       "sunChances": {str(turn): chance for turn, chance in (sunChances or {}).items()}}
+        self.writeSlots(slots)
+
+    def writeSlots(self, slots):
+        write_file_atomic(self.slotsPath, [json.dumps({"version": STORE_VERSION, "slots": slots}).encode()])
+
+    def load(self, name, width, height, depth=HISTORY_DEPTH):
+        """Returns (history, reaped, sunChances, rng), or None if there is no slot name for a width x height grid.
+        Raises SaveStoreError if blocks the slot needs are missing, or SaveError if it has crops that aren't loaded."""
+        slot = self.slots().get(name)
+        if slot is None or (slot["width"], slot["height"]) != (width, height):
+            return None
+        plantMap = plant_id_map(slot.get("plants"))
+        self.refresh()
+        pack = _map_file(self.packPath)
+
+        def read(digest):
+            if digest not in self.blocks:
+                raise SaveStoreError(f"Save {name!r} is damaged: block {digest.hex()} is missing")
+            offset, length = self.blocks[digest]
+            return pack[offset:offset+length]
+
+        history = History(depth)
+        for digests in _manifest_entries(read(bytes.fromhex(slot["manifest"]))):
+            entry, _ = decode_history_entry(b"".join(map(read, digests)), 0, width, height, plantMap)
+            history.append(entry)
+        history.drainPending()
+        rng = make_rng(slot["rng"], slot["seed"]) if slot.get("rng") in RNG_KINDS else None
+        return history, slot["reaped"], {int(turn): chance for turn, chance in slot.get("sunChances", {}).items()}, rng
+
+    def delete(self, name):
+        """Drop slot name; its blocks stay on disk until collect(). Returns False if there was none."""
+        slots = self.slots()
+        if name not in slots:
+            return False
+        del slots[name]
+        self.writeSlots(slots)
+        return True
+
+    def collect(self):
+        """Rewrite the pack with just the blocks some slot uses; returns the bytes freed."""
+        if not os.path.exists(self.packPath):
+            return 0
+        self.refresh()
+        pack = _map_file(self.packPath)
+        live = {}
+        for slot in self.slots().values():
+            digest = bytes.fromhex(slot["manifest"])
+            if digest not in self.blocks:
+                continue  # a damaged slot; load() reports it
+            offset, length = self.blocks[digest]
+            live[digest] = None
+            for digests in _manifest_entries(pack[offset:offset+length]):
+                live.update(dict.fromkeys(digests))
+        chunks, records, size = [], [], 0
+        for digest in filter(self.blocks.__contains__, live):
+            offset, length = self.blocks[digest]
+            chunks.append(pack[offset:offset+length])
+            records.append(STORE_BLOCK.pack(digest, size, length))
+            size += length
+        # Both new files are complete before either replaces the old pair; recover()
+        # finishes the swap if we stop between the two
+        write_file_atomic(f"{self.packPath}.new", chunks)
+        write_file_atomic(f"{self.indexPath}.new", records)
+        freed = (len(pack) if pack is not None else 0) - size
+        del pack, chunks
+        os.replace(f"{self.packPath}.new", self.packPath)
+        os.replace(f"{self.indexPath}.new", self.indexPath)
+        self.forget()
+        self.refresh()
+        return freed
+
+    def recover(self):
+        """Finish or roll back a collect() that was cut short."""
+        if os.path.exists(f"{self.indexPath}.new"):
+            if os.path.exists(f"{self.packPath}.new"):
+                os.remove(f"{self.packPath}.new")
+                os.remove(f"{self.indexPath}.new")
+            else:
+                os.replace(f"{self.indexPath}.new", self.indexPath)
+                self.forget()
+
+# Replay logs: REPLAY_HEADER, a JSON blob with the scenario, RNG, backend and plant_names(),
+# then records of REPLAY_RECORD (kind, number, payload length) + payload:
+# - REPLAY_COMMAND: the command text; number is the turn after it ran
+# - REPLAY_EDIT: an undo/redo. uint16 text length, text, uint32 count,
+#   uint32 offsets, new bytes at those offsets; number as for commands
+# - REPLAY_CHECKPOINT: number is how many commands came before it. uint32
+#   reaped, uint8 victory, uint16 length + JSON of the active weather events,
+#   plant types, sun chances and rng, then the state encoded as a history keyframe
+# The game's RNG draws only depend on the seed and the turn, so commands
+# replay exactly; undo/redo are stored as their effect because they depend
+# on history, which checkpoints leave out.
+REPLAY_MAGIC = b"FRPL"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sHI")  # magic, version, metadata length
+REPLAY_RECORD = struct.Struct("<BII")
+REPLAY_COMMAND = 0
+REPLAY_EDIT = 1
+REPLAY_CHECKPOINT = 2
+REPLAY_CHECKPOINT_INTERVAL = 128
+# Commands that don't change the game aren't logged
+REPLAY_UNLOGGED = ('export', 'profile', 'debug', 'q')
+
+class ReplayLog:
+    """Appends every command a game runs to a replay file, with a full
+    checkpoint at the start, after loads and every checkpointInterval commands."""
+    def __init__(self, path, game, checkpointInterval=REPLAY_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.checkpointInterval = checkpointInterval
+        self.commands = 0
+        self.lastCheckpoint = 0
+        scenario = {key: value for key, value in game.scenario.items() if key != 'timeline'}
+        metadata = json.dumps({"scenario": scenario, "rng": game.rng.kind, "seed": game.rng.seed,
+                               "backend": "chunked" if game.chunked else "dense", "plants": plant_names()}).encode()
+        self.file = open(path, "wb")
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, len(metadata)) + metadata)
+        self.checkpoint(game)
+
+    def write(self, kind, number, payload):
+        self.file.write(REPLAY_RECORD.pack(kind, number, len(payload)) + payload)
+        self.file.flush()
+
+    def record(self, game, text, before=None):
+        """Log a command; before is the state ahead of an undo/redo."""
+        if before is None:
+            self.write(REPLAY_COMMAND, game.getTurnNumber(), text.encode())
+        else:
+            indices = changed_indices(game.gameState, before)
+            data = text.encode()
+            self.write(REPLAY_EDIT, game.getTurnNumber(), b"".join([
+                struct.pack("<H", len(data)), data, struct.pack("<I", len(indices)), _le_bytes(indices),
+                bytes(game.gameState[i] for i in indices),
+            ]))
+        self.commands += 1
+        if self.commands - self.lastCheckpoint >= self.checkpointInterval:
+            self.checkpoint(game)
+
+    def checkpoint(self, game):
+        extra = json.dumps({"events": game.activeWeatherEvents, "plantTypes": game.availablePlantTypes,
+                            "sunChances": game.eventSunChances, "rng": game.rng.kind, "seed": game.rng.seed}).encode()
+        self.write(REPLAY_CHECKPOINT, self.commands, b"".join([
+            struct.pack("<IBH", game.fullyGrownPlantsReaped, game.victoryConditionMet, len(extra)), extra,
+            encode_history_entry(HistoryEntry(keyframe=game.gameState), game.gridDataSize),
+        ]))
+        self.lastCheckpoint = self.commands
+
+    def close(self):
+        self.file.close()
+
+class Replay:
+    """Random access to a replay log.
+
+    seek(n) gives the game as it was after its first n logged commands by
+    restoring the nearest checkpoint at or before n and replaying from
+    there, so it costs at most one checkpoint interval of commands.
+    """
+    def __init__(self, path):
+        buffer = _map_file(path)
+        if buffer is None:
+            raise FileNotFoundError(f"No replay log at {path}")
+        if len(buffer) < REPLAY_HEADER.size:
+            raise ValueError(f"{path} is not a replay log")
+        magic, version, length = REPLAY_HEADER.unpack_from(buffer, 0)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a replay log")
+        self.path = path
+        self.buffer = buffer
+        self.metadata = json.loads(bytes(buffer[REPLAY_HEADER.size:REPLAY_HEADER.size+length]))
+        # (kind, number, payload offset, payload length) of every complete record
+        self.records = []
+        self.turns = []  # turn after each command
+        self.commands = []  # record index of each command
+        self.checkpoints = []  # (commands before it, record index)
+        offset = REPLAY_HEADER.size + length
+        while offset + REPLAY_RECORD.size <= len(buffer):
+            kind, number, size = REPLAY_RECORD.unpack_from(buffer, offset)
+            offset += REPLAY_RECORD.size
+            if offset + size > len(buffer):
+                break  # torn write at the end of the log
+            if kind == REPLAY_CHECKPOINT:
+                self.checkpoints.append((number, len(self.records)))
+            else:
+                self.turns.append(number)
+                self.commands.append(len(self.records))
+            self.records.append((kind, number, offset, size))
+            offset += size
+        if not self.checkpoints:
+            raise ValueError(f"{path} has no checkpoint to start from")
+        self.game = Game(self.metadata["scenario"], headless=True, backend=self.metadata["backend"],
+                         rng=make_rng(self.metadata["rng"], self.metadata["seed"]))
+        # The game loads the scenario's crop packs, so map the log's plant IDs after it
+        self.plantMap = plant_id_map(self.metadata.get("plants"))
+        self.position = None
+
+    def __len__(self):
+        return len(self.turns)
+
+    def commandText(self, index):
+        """Text of the index-th logged command."""
+        kind, _, offset, size = self.records[self.commands[index]]
+        if kind == REPLAY_COMMAND:
+            return bytes(self.buffer[offset:offset+size]).decode()
+        (length,) = struct.unpack_from("<H", self.buffer, offset)
+        return bytes(self.buffer[offset+2:offset+2+length]).decode()
+
+    def restore(self, recordIndex):
+        _, _, offset, _ = self.records[recordIndex]
+        game = self.game
+        reaped, victory, length = struct.unpack_from("<IBH", self.buffer, offset)
+        offset += struct.calcsize("<IBH")
+        extra = json.loads(bytes(self.buffer[offset:offset+length]))
+        entry, _ = decode_history_entry(self.buffer, offset+length, game.width, game.height, self.plantMap)
+        game.setGameState(entry.keyframe)
+        game.history = History(game.history.depth)
+        game.pushStateToHistory()
+        game.rebuildCellIndexes()
+        game.fullyGrownPlantsReaped = reaped
+        game.victoryConditionMet = bool(victory)
+        game.activeWeatherEvents = extra["events"]
+        game.availablePlantTypes = extra["plantTypes"]
+        game.eventSunChances = {int(turn): chance for turn, chance in extra.get("sunChances", {}).items()}
+        if "rng" in extra:
+            # A load can change the rng partway through a log
+            game.rng = make_rng(extra["rng"], extra["seed"])
+
+    def apply(self, recordIndex):
+        kind, _, offset, size = self.records[recordIndex]
+        game = self.game
+        if kind == REPLAY_COMMAND:
+            game.handleInputCommand(bytes(self.buffer[offset:offset+size]).decode())
+        elif kind == REPLAY_EDIT:
+            (length,) = struct.unpack_from("<H", self.buffer, offset)
+            offset += 2 + length
+            (count,) = struct.unpack_from("<I", self.buffer, offset)
+            offset += 4
+            indices = _le_array('I', self.buffer[offset:offset+4*count])
+            values = array('B', self.buffer[offset+4*count:offset+5*count])
+            if self.plantMap is not None:
+                for k, i in enumerate(indices):
+                    if i < game.gridDataSize and i % CELL_DATA_SIZE == 2:
+                        values[k] = self.plantMap[values[k]]
+            game.applyChanges(indices, values)
+            game.pushStateToHistory()
+
+    def seek(self, command):
+        """The game after the first command logged commands (0 is the start)."""
+        command = max(0, min(command, len(self)))
+        # Latest checkpoint at or before the target; carry on from the current
+        # position instead when that is closer and not past the target
+        start, recordIndex = max(cp for cp in self.checkpoints if cp[0] <= command)
+        if self.position is not None and start <= self.position[0] <= command:
+            done, recordIndex = self.position
+        else:
+            self.restore(recordIndex)
+            done = start
+            recordIndex += 1
+        while done < command:
+            kind = self.records[recordIndex][0]
+            if kind != REPLAY_CHECKPOINT:
+                self.apply(recordIndex)
+                done += 1
+            recordIndex += 1
+        self.position = (done, recordIndex)
+        return self.game
+
+    def seekTurn(self, turn):
+        """The game when it first reached turn, or after the last command if it never did."""
+        for index, turnAfter in enumerate(self.turns):
+            if turnAfter >= turn:
+                return self.seek(index+1)
+        return self.seek(len(self))
+
+# Rendering
+CELL_WIDTH = 9
+
+class NullRenderer:
+    """Draws nothing and drops messages, for scripted and headless runs."""
+    def draw(self, game):
+        pass
+
+    def message(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+class FullRenderer:
+    """Prints the whole grid on every draw; works on any terminal."""
+    def __init__(self, out=None):
+        # None prints to whatever sys.stdout is at the time
+        self.out = out
+
+    def draw(self, game):
+        playerX = game.getPlayerX()
+        playerY = game.getPlayerY()
+
+        # We'll use a fixed width for each cell and debug info for alignment
+        # Let's choose width=9 characters for each cell and each debug entry.
+        cell_width = CELL_WIDTH
+
+        left, top, width, height = game.viewport()
+        if game.debugMode:
+            suns = game.cellSuns([y*game.width + x for y in range(top, top+height) for x in range(left, left+width)])
+        for y in range(top, top+height):
+            row_data = []
+            debug_data = []
+            for x in range(left, left+width):
+                cellIndex = game.getCellIndex(x,y)
+                sun = suns[(y-top)*width + x-left] if game.debugMode else None
+                moisture = game.gameState[cellIndex+1]
+                pType = game.gameState[cellIndex+2]
+                growthLevel = game.gameState[cellIndex+3]
+
+                ch = PlantRegistry.glyphs[pType]
+                if x == playerX and y == playerY:
+                    ch = 'P'
+
+                # If debug mode: append growth level to plant if there's a plant
+                display_cell = ch
+                if game.debugMode and pType != PlantType.NoneType:
+                    display_cell = f"{ch}{growthLevel}"
+
+                # Format the cell with fixed width (right-aligned)
+                row_data.append(f"{display_cell:>{cell_width}}")
+
+                if game.debugMode:
+                    # Format sun/moist line too
+                    # Max length "S255M255"=8 chars, we have cell_width=9 is fine
+                    debug_str = f"S{sun}M{moisture}"
+                    debug_data.append(f"{debug_str:>{cell_width}}")
+
+            print("".join(row_data), file=self.out)
+            if game.debugMode:
+                print("".join(debug_data), file=self.out)
+
+        print(f"Fully grown plants reaped: {game.fullyGrownPlantsReaped}", file=self.out)
+        if game.debugMode:
+            print("(Debug mode ON)", file=self.out)
+
+    def message(self, text):
+        print(text, file=self.out)
+
+    def flush(self):
+        pass
+
+class AnsiRenderer:
+    """Redraws only the cells that changed since the last frame.
+
+    The grid is pinned to the top of the screen and cells are addressed with
+    ANSI cursor moves. Each frame is assembled into one string and written
+    with a single call. Messages are held until the next frame (or flush())
+    and shown under the status line, where the prompt goes.
+    """
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.debug = None
+        self.view = None
+        self.cellKeys = []
+        self.debugKeys = []
+        self.cellText = {}
+        self.debugText = {}
+        self.messages = []
+
+    def draw(self, game):
+        debug = game.debugMode
+        view = game.viewport()
+        left, top, width, height = view
+        parts = []
+        if debug != self.debug or view != self.view:
+            # Layout changes with debug mode or a scrolled view; start from a clear screen
+            self.debug = debug
+            self.view = view
+            self.cellKeys = [None]*(width*height)
+            self.debugKeys = [None]*(width*height)
+            parts.append("\x1b[2J")
+
+        state = game.gameState
+        player = (game.getPlayerY()-top)*width + game.getPlayerX()-left
+        rowStep = 2 if debug else 1
+        cellKeys = self.cellKeys
+        if debug:
+            suns = game.cellSuns([(top + cell//width)*game.width + left + cell % width for cell in range(width*height)])
+        for cell in range(width*height):
+            y, x = divmod(cell, width)
+            cellIndex = game.getCellIndex(left+x, top+y)
+            pType = state[cellIndex+2]
+            key = (pType, state[cellIndex+3] if debug and pType != PlantType.NoneType else -1, cell == player)
+            if cellKeys[cell] != key:
+                cellKeys[cell] = key
+                text = self.cellText.get(key)
+                if text is None:
+                    display_cell = 'P' if key[2] else PlantRegistry.glyphs[pType]
+                    if key[1] >= 0:
+                        display_cell += str(key[1])
+                    text = self.cellText[key] = f"{display_cell:>{CELL_WIDTH}}"
+                parts.append(f"\x1b[{y*rowStep+1};{x*CELL_WIDTH+1}H{text}")
+            if debug:
+                debugKey = (suns[cell], state[cellIndex+1])
+                if self.debugKeys[cell] != debugKey:
+                    self.debugKeys[cell] = debugKey
+                    text = self.debugText.get(debugKey)
+                    if text is None:
+                        text = self.debugText[debugKey] = f"{f'S{debugKey[0]}M{debugKey[1]}':>{CELL_WIDTH}}"
+                    parts.append(f"\x1b[{y*rowStep+2};{x*CELL_WIDTH+1}H{text}")
+
+        parts.append(f"\x1b[{height*rowStep+1};1H\x1b[KFully grown plants reaped: {game.fullyGrownPlantsReaped}\r\n")
+        if debug:
+            parts.append("(Debug mode ON)\r\n")
+        parts.append("\x1b[J")
+        parts.extend(f"{text}\r\n" for text in self.messages)
+        self.messages = []
+        self.out.write("".join(parts))
+        self.out.flush()
+
+    def message(self, text):
+        self.messages.append(text)
+
+    def flush(self):
+        if self.messages:
+            self.out.write("".join(f"{text}\n" for text in self.messages))
+            self.out.flush()
+            self.messages = []
+
+RENDERERS = {
+    "full": FullRenderer,
+    "ansi": AnsiRenderer,
+    "none": NullRenderer,
+}
+
+def make_renderer(kind=None):
+    """Build a renderer by name, or pick one for stdout: differential
+    on a capable terminal, full redraw when output is piped or TERM=dumb."""
+    if kind is None:
+        capable = sys.stdout.isatty() and os.environ.get("TERM", "dumb") not in ("", "dumb")
+        kind = "ansi" if capable else "full"
+    return RENDERERS[kind]()
+
+# Profiling
+PROFILED_COMMANDS = ('w', 'a', 's', 'd', 'sow', 'reap', 'n', 'advance', 'undo', 'redo', 'export', 'debug', 'profile')
+
+class NullProfiler:
+    """Stand-in used while profiling is off; every hook does nothing."""
+    def begin(self):
+        return 0.0
+
+    def end(self, phase, started):
+        pass
+
+    def command(self, name, started):
+        pass
+
+    def evaluated(self, crop, count=1):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+class Timing:
+    """Call count, total/min/max and a power-of-two histogram of durations.
+
+    Bucket b counts durations below 2**b microseconds (and at least half that).
+    """
+    __slots__ = ("calls", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = int(seconds*1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        """Upper bound in seconds of the bucket holding that fraction of calls."""
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction*self.calls:
+                return min(2**bucket / 1e6, self.max)
+        return 0.0
+
+    def toJson(self):
+        return {
+            "calls": self.calls,
+            "totalSeconds": self.total,
+            "minSeconds": self.min,
+            "maxSeconds": self.max,
+            "histogramMicroseconds": {f"<{2**b}": n for b, n in sorted(self.buckets.items())},
+        }
+
+class Profiler:
+    """Wall time per turn phase and per command, and growth checks per crop."""
+    def __init__(self):
+        self.phases = {}
+        self.commands = {}
+        self.growthChecks = {}
+
+    def begin(self):
+        return time.perf_counter()
+
+    def end(self, phase, started):
+        timing = self.phases.get(phase)
+        if timing is None:
+            timing = self.phases[phase] = Timing()
+        timing.add(time.perf_counter() - started)
+
+    def command(self, name, started):
+        timing = self.commands.get(name)
+        if timing is None:
+            timing = self.commands[name] = Timing()
+        timing.add(time.perf_counter() - started)
+
+    def evaluated(self, crop, count=1):
+        self.growthChecks[crop] = self.growthChecks.get(crop, 0) + count
+
+    def toJson(self):
+        return {
+            "phases": {name: timing.toJson() for name, timing in self.phases.items()},
+            "commands": {name: timing.toJson() for name, timing in self.commands.items()},
+            "growthChecks": dict(self.growthChecks),
+        }
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.toJson(), f, indent=2)
+
+    def summary(self):
+        lines = []
+        for title, timings in (("Phase", self.phases), ("Command", self.commands)):
+            if not timings:
+                continue
+            lines.append(f"{title:<10}{'calls':>8}{'total ms':>11}{'mean us':>10}{'p50 us':>9}{'p95 us':>9}{'max us':>10}")
+            for name, t in sorted(timings.items(), key=lambda item: -item[1].total):
+                lines.append(f"{name:<10}{t.calls:>8}{t.total*1e3:>11.2f}{t.total/t.calls*1e6:>10.1f}"
+                             f"{t.percentile(0.5)*1e6:>9.0f}{t.percentile(0.95)*1e6:>9.0f}{t.max*1e6:>10.1f}")
+        if self.growthChecks:
+            lines.append("Growth checks: " + ", ".join(f"{crop} {n}" for crop, n in sorted(self.growthChecks.items())))
+        return "\n".join(lines) or "Nothing profiled yet."
+
 class Game:
-    def __init__(self, scenario):
-        self.gameState = [0]*(GAME_STATE_SIZE)
+    def __init__(self, scenario, engine="scalar", historyDepth=HISTORY_DEPTH, backgroundSave=True, headless=False, rng=None, renderer=None,
+                 backend=None, profile=False, profilePath=None, replayPath=None, saveDir="", saveWriter=None, workers=None):
+        scenario = compile_scenario(scenario)
+        self.width, self.height = grid_size(scenario)
+        self.cellCount = self.width*self.height
+        self.gridDataSize = self.cellCount*CELL_DATA_SIZE
+        self.stateSize = self.gridDataSize + STATE_TAIL.size
+        # "dense" keeps every cell in one flat list; "chunked" only stores tiles that were ever touched
+        backend = backend or scenario['startingConditions'].get('storage') or (
+            "chunked" if self.cellCount > DENSE_MAX_CELLS else "dense")
+        if backend not in ("dense", "chunked"):
+            raise ValueError(f"Unknown grid backend {backend!r}")
+        self.chunked = backend == "chunked"
+        self.setGameState(ChunkedGrid(self.width, self.height) if self.chunked else bytearray(self.stateSize))
         self.actionMode = 'none'
         self.victoryConditionMet = False
-        self.fullyGrownPlantsReaped = scenario['startingConditions']['fullyGrownPlantsReaped']
-        self.history = []
-        self.future = []
+        self.fullyGrownPlantsReaped = scenario['startingConditions'].get('fullyGrownPlantsReaped', 0)
+        # historyDepth 0 keeps no history, for search code that tracks states itself
+        self.history = History(historyDepth) if historyDepth else None
         self.scenario = scenario
-        self.availablePlantTypes = ["Wheat", "Corn", "Rice"]
+        self.availablePlantTypes = list(scenario['startingConditions'].get('availablePlantTypes', DEFAULT_PLANT_TYPES))
         self.activeWeatherEvents = {}
         self.debugMode = False
+        # Headless games skip drawing, messages and autosaves (batch simulations)
+        self.headless = headless
+        self.renderer = NullRenderer() if headless else (renderer or make_renderer())
+        # Weather and sowing draws; pass a seeded rng for reproducible runs
+        self.rng = rng if rng is not None else CounterRng()
+        # Forks made so far, which gives each one a different seed
+        self.forks = 0
+        # The vectorized and parallel engines need NumPy and a dense grid; otherwise we stay
+        # on the scalar loop. workers is the parallel engine's process count (default: all cores).
+        self.engine = None
+        if engine in ("vectorized", "parallel") and np is not None and not self.chunked:
+            self.engine = ParallelEngine(self, workers) if engine == "parallel" else VectorizedEngine(self)
+        # Per-cell counts of same-type and non-empty neighbors, kept current by setPlantType.
+        # Chunked grids count neighbors on demand instead of paying a byte per cell.
+        self.sameNeighbors = None if self.chunked else bytearray(self.cellCount)
+        self.anyNeighbors = None if self.chunked else bytearray(self.cellCount)
+        # Cell numbers of the plants still growing, and of the other cells that get
+        # weather but haven't saturated with rain yet; see stepGrid
+        self.activeCells = set()
+        self.thirstyCells = set()
+        # Whether a fork shares those two sets with this game, so they are copied before changing
+        self.cellSetsShared = False
+        # The same for sameNeighbors and anyNeighbors
+        self.neighborCountsShared = False
+        # Sun chance of turns stepped while an event changed it, for cellSuns after an undo
+        self.eventSunChances = {}
+        # Autosaves, saves and exports go in saveDir (the working directory by default);
+        # saveWriter is an AutoSaveWriter to share with other games
+        self.saveDir = saveDir
+        self.autosave = None if headless else SaveJournal(os.path.join(saveDir, "autosave"), self.width, self.height,
+                                                          background=backgroundSave, writer=saveWriter)
+        self.saves = SaveStore(os.path.join(saveDir, SAVE_STORE_DIR))
+        # Timings collect in stats while profiling is on (profile=True or debug mode);
+        # otherwise profiler is the no-op NULL_PROFILER. profilePath gets a JSON dump on quit.
+        self.stats = Profiler()
+        self.profileFlag = profile or profilePath is not None
+        self.profilePath = profilePath
+        self.profiler = self.stats if self.profileFlag else NULL_PROFILER
 
         self.initializeGameState()
         self.pushStateToHistory()
+        # Every command from here on is logged to replayPath when it is given
+        self.replayLog = ReplayLog(replayPath, self) if replayPath else None
 
     def initializeGameState(self):
-        for i in range(0, GRID_DATA_SIZE, CELL_DATA_SIZE):
-            self.gameState[i]   = 0     # sun
-            self.gameState[i+1] = 0     # moisture
-            self.gameState[i+2] = PlantType.NoneType
-            self.gameState[i+3] = 0
-
+        # Cells start with no sun, no moisture and no plant, which is all zeros
         sc = self.scenario['startingConditions']
         self.setPlayerPosition(sc['playerPosition'][0], sc['playerPosition'][1])
         for cellData in sc['grid']:
@@ -143,43 +2477,327 @@ class Game:
             self.gameState[cellIndex+3] = cellData['growthLevel']
 
         self.setTurnNumber(0)
+        self.rebuildCellIndexes()
 
     def getPlantTypeFromString(self, t):
-        t = t.lower()
-        if t == 'wheat': return PlantType.Wheat
-        elif t == 'corn': return PlantType.Corn
-        elif t == 'rice': return PlantType.Rice
-        return PlantType.NoneType
+        return PlantRegistry.ids.get(t.lower(), PlantType.NoneType)
 
     def getCellIndex(self, x, y):
-        return (y * GRID_WIDTH + x)*CELL_DATA_SIZE
+        return (y * self.width + x)*CELL_DATA_SIZE
+
+    def inBounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def viewport(self):
+        """(left, top, width, height) of the part of the grid shown, following the player."""
+        width = min(self.width, VIEWPORT_WIDTH)
+        height = min(self.height, VIEWPORT_HEIGHT)
+        left = min(max(self.getPlayerX() - width//2, 0), self.width - width)
+        top = min(max(self.getPlayerY() - height//2, 0), self.height - height)
+        return left, top, width, height
+
+    def setPlantType(self, x, y, plantType):
+        cellIndex = self.getCellIndex(x, y)
+        oldType = self.gameState[cellIndex+2]
+        if oldType == plantType:
+            return
+        if self.chunked:
+            grid = self.gameState
+            key, _ = grid.locate(cellIndex)
+            hadPlants = key in grid.chunks and grid.chunks[key].plants > 0
+            grid[cellIndex+2] = plantType
+            # A tile's cells only get weather while it has plants in it
+            if hadPlants != (key in grid.chunks and grid.chunks[key].plants > 0):
+                if not hadPlants:
+                    self.replayRain(key)
+                for _, cell in grid.chunkCells(key):
+                    self.trackCell(cell)
+            return
+        self.gameState[cellIndex+2] = plantType
+        if self.neighborCountsShared:
+            self.ownNeighborCounts()
+
+        same = 0
+        anyDelta = (plantType != PlantType.NoneType) - (oldType != PlantType.NoneType)
+        for dx, dy in ((-1,0),(1,0),(0,-1),(0,1)):
+            nx, ny = x+dx, y+dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                neighborCell = ny*self.width + nx
+                neighbor = self.gameState[neighborCell*CELL_DATA_SIZE+2]
+                if neighbor != PlantType.NoneType:
+                    if neighbor == oldType:
+                        self.sameNeighbors[neighborCell] -= 1
+                    if neighbor == plantType:
+                        self.sameNeighbors[neighborCell] += 1
+                        same += 1
+                self.anyNeighbors[neighborCell] += anyDelta
+        self.sameNeighbors[y*self.width + x] = same
+
+    def neighborCounts(self, x, y, plantType):
+        """(same-type, non-empty) neighbor counts read straight from the grid."""
+        same = adjacent = 0
+        for dx, dy in ((-1,0),(1,0),(0,-1),(0,1)):
+            nx, ny = x+dx, y+dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                neighbor = self.gameState[self.getCellIndex(nx, ny)+2]
+                if neighbor != PlantType.NoneType:
+                    adjacent += 1
+                    if neighbor == plantType:
+                        same += 1
+        return same, adjacent
+
+    def replayRain(self, key):
+        """Give a chunked grid's tile the moisture it would have if it had had
+        weather every turn, as on a dense grid, before it starts getting it again.
+
+        Moisture only rises with rain, so that is the rain draws of turns 1 up
+        to now replayed from zero, with each turn's rain chance as the
+        scenario's events set it.
+        """
+        grid = self.gameState
+        moisture = {cell: 0 for _, cell in grid.chunkCells(key)}
+        pending = list(moisture)
+        for turn, rainChance in enumerate(self.pastRainChances(self.getTurnNumber())):
+            if not pending:
+                break
+            if turn == 0 or rainChance <= 0:
+                continue
+            draws = self.rng.weatherAt(turn, [2*cell+1 for cell in pending])
+            unsaturated = []
+            for cell, draw in zip(pending, draws):
+                if draw < rainChance:
+                    moisture[cell] = min(moisture[cell] + 127, 255)
+                if moisture[cell] < 255:
+                    unsaturated.append(cell)
+            pending = unsaturated
+        for cell, value in moisture.items():
+            grid[cell*CELL_DATA_SIZE+1] = value
+
+    def pastRainChances(self, last):
+        """Rain chance of turns 0..last going by the scenario's weather events
+        alone; see handleScheduledEvents."""
+        events = {}
+        chances = [self.getCurrentRainChance(events)]
+        for turn in range(1, last+1):
+            for kind, event in self.scenario['timeline'].get(turn, ()):
+                if kind == "weather":
+                    events[event['type']] = event['duration']
+            events = {et: remaining-1 for et, remaining in events.items() if remaining > 1}
+            chances.append(self.getCurrentRainChance(events))
+        return chances
+
+    def getsWeather(self, cell):
+        """Whether weather runs on cell; on chunked grids, only tiles with plants get it."""
+        if not self.chunked:
+            return True
+        chunk = self.gameState.chunks.get(self.gameState.locate(cell*CELL_DATA_SIZE)[0])
+        return chunk is not None and chunk.plants > 0
+
+    def trackCell(self, cell):
+        """File cell under activeCells or thirstyCells (or neither) to match what is in it now."""
+        state = self.gameState
+        cellIndex = cell*CELL_DATA_SIZE
+        if self.cellSetsShared:
+            self.ownCellSets()
+        if state[cellIndex+3] < PlantRegistry.maxGrowth[state[cellIndex+2]]:
+            if cell not in self.activeCells:
+                # Growing plants keep their sun in gameState; bring it up to date
+                state[cellIndex] = self.cellSuns([cell])[0]
+                self.activeCells.add(cell)
+            self.thirstyCells.discard(cell)
+            return
+        self.activeCells.discard(cell)
+        if state[cellIndex+1] < 255 and self.getsWeather(cell):
+            self.thirstyCells.add(cell)
+        else:
+            self.thirstyCells.discard(cell)
+
+    def ownCellSets(self):
+        """Copy activeCells and thirstyCells shared with a fork before changing them in place."""
+        self.activeCells = set(self.activeCells)
+        self.thirstyCells = set(self.thirstyCells)
+        self.cellSetsShared = False
+
+    def ownNeighborCounts(self):
+        """Copy sameNeighbors and anyNeighbors shared with a fork before changing them in place."""
+        self.sameNeighbors = self.sameNeighbors[:]
+        self.anyNeighbors = self.anyNeighbors[:]
+        self.neighborCountsShared = False
+
+    def weatheredCells(self):
+        """Every cell weather runs on."""
+        if not self.chunked:
+            return range(self.cellCount)
+        grid = self.gameState
+        return [cell for key, chunk in grid.chunks.items() if chunk.plants for _, cell in grid.chunkCells(key)]
+
+    def rebuildCellIndexes(self):
+        """Recompute the neighbor counts and the active and thirsty cells from the grid."""
+        self.rebuildNeighborCounts()
+        state = self.gameState
+        maxGrowth = PlantRegistry.maxGrowth
+        self.cellSetsShared = False
+        if np is not None and not self.chunked:
+            cells = self.cellArray()
+            growing = cells[:, :, 3] < np.frombuffer(maxGrowth, dtype=np.uint8)[cells[:, :, 2]]
+            self.activeCells = set(np.flatnonzero(growing).tolist())
+            self.thirstyCells = set(np.flatnonzero(~growing & (cells[:, :, 1] < 255)).tolist())
+            return
+        self.activeCells = set()
+        self.thirstyCells = set()
+        for cell in self.weatheredCells():
+            cellIndex = cell*CELL_DATA_SIZE
+            if state[cellIndex+3] < maxGrowth[state[cellIndex+2]]:
+                self.activeCells.add(cell)
+            elif state[cellIndex+1] < 255:
+                self.thirstyCells.add(cell)
+
+    def applyChanges(self, indices, values):
+        """Write values at the state offsets indices, keeping neighbor counts and cell indexes in step.
+
+        Past BULK_CHANGE_CELLS changes per cell of the grid it is cheaper to
+        write them all and rebuild the indexes in one go.
+        """
+        state = self.gameState
+        if len(indices) > self.cellCount*BULK_CHANGE_CELLS:
+            if np is not None and isinstance(state, bytearray):
+                np.frombuffer(state, dtype=np.uint8)[np.asarray(indices)] = np.asarray(values, dtype=np.uint8)
+            else:
+                for i, value in zip(indices, values):
+                    state[i] = value
+            self.rebuildCellIndexes()
+            return
+        cells = set()
+        plantTypes = []
+        for i, value in zip(indices, values):
+            if i >= self.gridDataSize:
+                state[i] = value
+                continue
+            cell, field = divmod(i, CELL_DATA_SIZE)
+            cells.add(cell)
+            if field == 2:
+                plantTypes.append((cell, value))
+            else:
+                state[i] = value
+        # Plant types go last so the turn and growth are already in place
+        for cell, plantType in plantTypes:
+            y, x = divmod(cell, self.width)
+            self.setPlantType(x, y, plantType)
+        for cell in cells:
+            self.trackCell(cell)
+
+    def cellSuns(self, cells):
+        """This turn's sun on each of cells.
+
+        Only growing plants keep their sun current in gameState; for any
+        other cell that gets weather it is recomputed from the turn's draw.
+        """
+        turn = self.getTurnNumber()
+        state = self.gameState
+        suns = [state[cell*CELL_DATA_SIZE] for cell in cells]
+        if turn == 0:
+            return suns
+        weathered = [n for n, cell in enumerate(cells) if cell not in self.activeCells and self.getsWeather(cell)]
+        sunChance = self.eventSunChances.get(turn, min(self.scenario['weatherPolicy']['sunChance'], 1.0))
+        draws = self.rng.weatherAt(turn, [2*cells[n] for n in weathered])
+        for n, draw in zip(weathered, draws):
+            suns[n] = 255 if draw < sunChance else 0
+        return suns
+
+    def settledState(self, state=None):
+        """A copy of state (gameState by default) with every cell's sun filled in, for exports.
+
+        As in cellSuns, cells without a growing plant get their turn's draw;
+        which cells those are is read from state itself.
+        """
+        state = (self.gameState if state is None else state)[:]
+        turn = STATE_TAIL.unpack(bytes(state[self.gridDataSize + i] for i in range(STATE_TAIL.size)))[2]
+        if turn == 0:
+            return state
+        maxGrowth = PlantRegistry.maxGrowth
+        cells = [cell for cell in self.weatheredCells()
+                 if state[cell*CELL_DATA_SIZE+3] >= maxGrowth[state[cell*CELL_DATA_SIZE+2]]]
+        sunChance = self.eventSunChances.get(turn, min(self.scenario['weatherPolicy']['sunChance'], 1.0))
+        for cell, draw in zip(cells, self.rng.weatherAt(turn, [2*cell for cell in cells])):
+            state[cell*CELL_DATA_SIZE] = 255 if draw < sunChance else 0
+        return state
+
+    def rebuildNeighborCounts(self):
+        if self.sameNeighbors is None:
+            return
+        if self.neighborCountsShared:
+            self.ownNeighborCounts()
+        if np is not None:
+            same, adjacent = neighbor_count_arrays(self.cellArray()[:, :, 2])
+            self.sameNeighbors[:] = same.tobytes()
+            self.anyNeighbors[:] = adjacent.tobytes()
+            return
+        state = self.gameState
+        for y in range(self.height):
+            for x in range(self.width):
+                cell = y*self.width + x
+                self.sameNeighbors[cell], self.anyNeighbors[cell] = self.neighborCounts(x, y, state[cell*CELL_DATA_SIZE+2])
+
+    def cellArray(self):
+        """A dense grid's cells as a (height, width, CELL_DATA_SIZE) uint8 array; a copy for a PagedGrid."""
+        state = self.gameState
+        if isinstance(state, SharedGrid):
+            state = state.view
+        elif isinstance(state, PagedGrid):
+            state = state[:]
+        return np.frombuffer(state, dtype=np.uint8, count=self.gridDataSize).reshape(self.height, self.width, CELL_DATA_SIZE)
+
+    def unpageState(self):
+        """Join a forked PagedGrid back into one bytearray before stepping turns.
+
+        A turn reads and writes cells all over the grid, which costs less on
+        a flat buffer (and the engines need one) than the page copies save.
+        """
+        if isinstance(self.gameState, PagedGrid):
+            self.setGameState(self.gameState[:])
+
+    def setGameState(self, state):
+        self.gameState = state
+        # Typed views over the tail: player x/y as uint16, turn as uint32
+        tail = memoryview(state if isinstance(state, bytearray) else state.tail)[-STATE_TAIL.size:]
+        self.playerView = tail[:PLAYER_DATA_SIZE].cast('H')
+        self.turnView = tail[PLAYER_DATA_SIZE:].cast('I')
 
     def setPlayerPosition(self, x, y):
-        playerIndex = GRID_DATA_SIZE
-        self.gameState[playerIndex] = x
-        self.gameState[playerIndex+1] = y
+        self.playerView[0] = x
+        self.playerView[1] = y
 
     def getPlayerX(self):
-        return self.gameState[GRID_DATA_SIZE]
+        return self.playerView[0]
 
     def getPlayerY(self):
-        return self.gameState[GRID_DATA_SIZE+1]
+        return self.playerView[1]
 
     def setTurnNumber(self, turn):
-        turnIndex = GRID_DATA_SIZE + PLAYER_DATA_SIZE
-        self.gameState[turnIndex] = turn
+        self.turnView[0] = turn
 
     def getTurnNumber(self):
-        turnIndex = GRID_DATA_SIZE + PLAYER_DATA_SIZE
-        return self.gameState[turnIndex]
+        return self.turnView[0]
 
     def handleInputCommand(self, cmd):
         parts = cmd.strip().split()
         if len(parts) == 0:
             return
+        started = self.profiler.begin()
+        logged = self.replayLog is not None and parts[0] not in REPLAY_UNLOGGED
+        before = self.gameState[:] if logged and parts[0] in ('undo', 'redo') else None
+        self.runCommand(parts)
+        if logged:
+            self.replayLog.record(self, " ".join(parts), before)
+        self.profiler.command(parts[0] if parts[0] in PROFILED_COMMANDS else "other", started)
+
+    def runCommand(self, parts):
+        if parts[0] == 'profile':
+            self.profileCommand(parts[1:])
+            return
 
         if self.victoryConditionMet:
-            print("You already achieved victory!")
+            self.log("You already achieved victory!")
             return
 
         if parts[0] in ['w','a','s','d'] and self.actionMode == 'none':
@@ -195,7 +2813,7 @@ class Game:
             self.autoSaveGame()
         elif parts[0] == 'sow':
             if len(parts) < 2:
-                print("Specify direction: sow up/down/left/right")
+                self.log("Specify direction: sow up/down/left/right")
                 return
             direction = parts[1]
             if self.actionMode == 'none':
@@ -206,7 +2824,7 @@ class Game:
                 self.autoSaveGame()
         elif parts[0] == 'reap':
             if len(parts) < 2:
-                print("Specify direction: reap up/down/left/right")
+                self.log("Specify direction: reap up/down/left/right")
                 return
             direction = parts[1]
             if self.actionMode == 'none':
@@ -217,27 +2835,58 @@ class Game:
                 self.autoSaveGame()
         elif parts[0] == 'n':
             self.nextTurn()
+        elif parts[0] == 'advance':
+            if len(parts) < 2 or not parts[1].isdigit() or int(parts[1]) < 1:
+                self.log("Specify how many turns: advance N")
+                return
+            self.advance(int(parts[1]))
         elif parts[0] == 'undo':
             self.undo()
         elif parts[0] == 'redo':
             self.redo()
+        elif parts[0] == 'export':
+            self.exportGame(parts[1] if len(parts) > 1 else None)
         elif parts[0] == 'debug':
             self.debugMode = not self.debugMode
+            self.profiler = self.stats if self.debugMode or self.profileFlag else NULL_PROFILER
             self.draw()
         elif parts[0] == 'q':
-            print("Quitting...")
+            self.log("Quitting...")
+            if self.profiler is self.stats:
+                self.log(self.stats.summary())
+            if self.profilePath:
+                self.stats.export(self.profilePath)
+            self.renderer.flush()
+            if self.autosave is not None:
+                self.autosave.flush()
             sys.exit(0)
         else:
-            print("Unknown command.")
+            self.log("Unknown command.")
+
+    def profileCommand(self, args):
+        if not args:
+            self.log(self.stats.summary() if self.profiler is self.stats else
+                     "Profiling is off; turn on debug mode or start with --profile.")
+        elif args[0] == 'export' and len(args) == 2:
+            # Relative to saveDir, like the game's own exports
+            self.stats.export(os.path.join(self.saveDir, args[1]))
+            self.log(f'Profile written to "{args[1]}"')
+        elif args[0] == 'reset':
+            self.stats = Profiler()
+            if self.profiler is not NULL_PROFILER:
+                self.profiler = self.stats
+            self.log("Profile counters reset.")
+        else:
+            self.log("Usage: profile, profile export FILE, profile reset")
 
     def movePlayer(self, direction):
         x = self.getPlayerX()
         y = self.getPlayerY()
 
         if direction == Direction.Up and y > 0: y -= 1
-        elif direction == Direction.Down and y < GRID_HEIGHT - 1: y += 1
+        elif direction == Direction.Down and y < self.height - 1: y += 1
         elif direction == Direction.Left and x > 0: x -= 1
-        elif direction == Direction.Right and x < GRID_WIDTH - 1: x += 1
+        elif direction == Direction.Right and x < self.width - 1: x += 1
 
         self.setPlayerPosition(x, y)
         self.pushStateToHistory()
@@ -249,7 +2898,7 @@ class Game:
         elif direction == 'left': dx = -1
         elif direction == 'right': dx = 1
         else:
-            print("Invalid direction.")
+            self.log("Invalid direction.")
             return
 
         x = self.getPlayerX()
@@ -257,8 +2906,8 @@ class Game:
         targetX = x+dx
         targetY = y+dy
 
-        if targetX < 0 or targetX >= GRID_WIDTH or targetY < 0 or targetY >= GRID_HEIGHT:
-            print("Cannot perform action outside the grid.")
+        if not self.inBounds(targetX, targetY):
+            self.log("Cannot perform action outside the grid.")
             return
 
         cellIndex = self.getCellIndex(targetX, targetY)
@@ -266,62 +2915,231 @@ class Game:
         if self.actionMode == 'sow':
             plantType = self.gameState[cellIndex+2]
             if plantType == PlantType.NoneType:
-                newPlant = self.getRandomPlantType()
-                self.gameState[cellIndex+2] = newPlant
+                newPlant = self.getRandomPlantType(targetY*self.width + targetX)
+                self.setPlantType(targetX, targetY, newPlant)
                 self.gameState[cellIndex+3] = 1
+                self.trackCell(targetY*self.width + targetX)
                 self.pushStateToHistory()
-                print("Sowed a seed.")
+                self.log("Sowed a seed.")
             else:
-                print("There's already a plant here.")
+                self.log("There's already a plant here.")
         elif self.actionMode == 'reap':
             plantType = self.gameState[cellIndex+2]
             growthLevel = self.gameState[cellIndex+3]
             if plantType != PlantType.NoneType:
-                if growthLevel >= 3:
+                if growthLevel >= PlantRegistry.maxGrowth[plantType]:
                     self.fullyGrownPlantsReaped += 1
-                self.gameState[cellIndex+2] = PlantType.NoneType
+                self.setPlantType(targetX, targetY, PlantType.NoneType)
                 self.gameState[cellIndex+3] = 0
+                self.trackCell(targetY*self.width + targetX)
                 self.pushStateToHistory()
                 self.checkVictoryCondition()
-                print("Reaped a plant.")
+                self.log("Reaped a plant.")
             else:
-                print("No plant here to reap.")
+                self.log("No plant here to reap.")
 
-    def getRandomPlantType(self):
-        pt_name = random.choice(self.availablePlantTypes)
+    def getRandomPlantType(self, cell):
+        pt_name = self.rng.choice(self.availablePlantTypes, self.getTurnNumber(), cell)
         return self.getPlantTypeFromString(pt_name)
 
     def nextTurn(self):
         if self.victoryConditionMet:
-            print("You already achieved victory!")
+            self.log("You already achieved victory!")
             return
         turn = self.getTurnNumber()
+        if turn >= MAX_TURN:
+            self.log("This is the last turn there is.")
+            return
+        self.unpageState()
         turn += 1
         self.setTurnNumber(turn)
 
+        started = self.profiler.begin()
         self.handleScheduledEvents(turn)
+        self.profiler.end("events", started)
 
-        for x in range(GRID_WIDTH):
-            for y in range(GRID_HEIGHT):
-                cellIndex = self.getCellIndex(x, y)
-                sun = 255 if random.random() < self.getCurrentSunChance() else 0
-                self.gameState[cellIndex] = sun
-                rain = 255 if random.random() < self.getCurrentRainChance() else 0
-                moisture = self.gameState[cellIndex+1]
-                moisture += int(rain*0.5)
-                if moisture > 255: moisture = 255
-                self.gameState[cellIndex+1] = moisture
-
-                plantType = self.gameState[cellIndex+2]
-                growthLevel = self.gameState[cellIndex+3]
-                if plantType != PlantType.NoneType and growthLevel < 3:
-                    if self.checkGrowthConditions(x,y):
-                        self.gameState[cellIndex+3] = growthLevel+1
+        if self.engine is not None:
+            self.engine.step(turn)
+        else:
+            self.stepGrid(turn)
 
         self.pushStateToHistory()
         self.draw()
         self.autoSaveGame()
 
+    def advance(self, turns):
+        """Run up to turns turns with one history entry, draw and autosave at the end.
+
+        Stretches where provably no plant can grow are jumped over in one go
+        with the same end state as stepping them. Stops early once every
+        plant is fully grown. Returns the number of turns advanced.
+        """
+        if self.victoryConditionMet:
+            self.log("You already achieved victory!")
+            return 0
+        start = self.getTurnNumber()
+        if turns > MAX_TURN - start:
+            self.log(f"Can advance at most {MAX_TURN - start} more turns.")
+            return 0
+        self.unpageState()
+        end = start + turns
+        turn = start
+        while turn < end:
+            plants = list(self.growingPlants())
+            if not plants:
+                break
+            quietUntil = self.quietUntil(plants, turn+1, end)
+            if quietUntil > turn:
+                started = self.profiler.begin()
+                self.skipTurns(turn+1, quietUntil)
+                self.profiler.end("skip", started)
+                turn = quietUntil
+                continue
+            turn += 1
+            self.setTurnNumber(turn)
+            started = self.profiler.begin()
+            self.handleScheduledEvents(turn)
+            self.profiler.end("events", started)
+            if self.engine is not None:
+                self.engine.step(turn)
+            else:
+                self.stepGrid(turn)
+
+        advanced = turn - start
+        if advanced < turns:
+            self.log(f"Nothing left to grow; stopped after {advanced} turns.")
+        else:
+            self.log(f"Advanced {advanced} turns.")
+        if advanced:
+            self.pushStateToHistory()
+            self.draw()
+            self.autoSaveGame()
+        return advanced
+
+    def growingPlants(self):
+        """(x, y) of every plant below full growth."""
+        for cell in self.activeCells:
+            yield divmod(cell, self.width)[::-1]
+
+    def quietUntil(self, plants, first, end):
+        """Last turn up to end such that turns first..that turn have no events
+        starting or ending and no plant could grow in any of them, or first-1."""
+        last = end
+        for turn in self.scenario['timeline']:
+            if first <= turn <= last:
+                last = turn - 1
+        for remaining in self.activeWeatherEvents.values():
+            # handleScheduledEvents counts down and drops the event on the turn it reaches 0
+            last = min(last, first + remaining - 2)
+        if last < first:
+            return first - 1
+
+        sunChance = self.getCurrentSunChance()
+        rainChance = self.getCurrentRainChance()
+        suns = [sun for sun, possible in ((0, sunChance < 1), (255, sunChance > 0)) if possible]
+        for x, y in plants:
+            cellIndex = self.getCellIndex(x, y)
+            plantType = self.gameState[cellIndex+2]
+            definition = PlantRegistry.get_definition(plantType)
+            evaluator = definition.compile() if definition is not None else None
+            if evaluator is None:
+                return first - 1  # hand-written conditions can't be analysed
+            # Moisture only ever rises, by 127 per rain, up to 255
+            moisture = self.gameState[cellIndex+1]
+            moistures = [moisture]
+            while rainChance > 0 and moisture < 255:
+                moisture = min(moisture + 127, 255)
+                moistures.append(moisture)
+            same, adjacent = self.neighborCounts(x, y, plantType)
+            # turnGreaterThan is the only turn rule, so the last turn is the most permissive
+            for sun in suns:
+                for moisture in moistures:
+                    if evaluator.check(sun, moisture, same, adjacent, last, self.activeWeatherEvents):
+                        return first - 1
+        return last
+
+    def skipTurns(self, first, last):
+        """Apply the weather of turns first..last without checking growth.
+
+        Only valid when quietUntil says nothing can grow: sun is just the last
+        turn's draw and moisture replays the rain draws until it saturates.
+        """
+        sunChance = self.getCurrentSunChance()
+        rainChance = self.getCurrentRainChance()
+        state = self.gameState
+        # Other cells' sun is worked out when read (see stepGrid)
+        self.recordSunChance(last, sunChance)
+        active = list(self.activeCells)
+        draws = self.rng.weatherAt(last, [2*cell for cell in active])
+        for cell, draw in zip(active, draws):
+            state[cell*CELL_DATA_SIZE] = 255 if draw < sunChance else 0
+        pending = [cell for cell in active if state[cell*CELL_DATA_SIZE+1] < 255] + list(self.thirstyCells)
+        if rainChance <= 0:
+            pending = []
+        for turn in range(first, last+1):
+            if not pending:
+                break
+            draws = self.rng.weatherAt(turn, [2*cell+1 for cell in pending])
+            unsaturated = []
+            for cell, draw in zip(pending, draws):
+                moistureIndex = cell*CELL_DATA_SIZE+1
+                if draw < rainChance:
+                    state[moistureIndex] = min(state[moistureIndex] + 127, 255)
+                if state[moistureIndex] < 255:
+                    unsaturated.append(cell)
+            pending = unsaturated
+        self.thirstyCells = {cell for cell in self.thirstyCells if state[cell*CELL_DATA_SIZE+1] < 255}
+
+        for event in self.activeWeatherEvents:
+            self.activeWeatherEvents[event] -= last - first + 1
+        self.setTurnNumber(last)
+
+    def stepGrid(self, turn):
+        """Weather and growth for one turn.
+
+        Only growing plants (activeCells) need this turn's sun and a growth
+        check. Any other cell's sun is worked out when it is read
+        (cellSuns), so all weather changes there is moisture, and only until
+        it saturates at 255 (thirstyCells). A turn costs one pass over the
+        growing plants plus the cells still filling up with rain. On chunked
+        grids, tiles without plants get no weather; replayRain catches their
+        moisture up when a plant goes in.
+        """
+        started = self.profiler.begin()
+        active = list(self.activeCells)
+        thirsty = list(self.thirstyCells)
+        draws = self.rng.weatherAt(turn, [2*cell + i for cell in active for i in (0, 1)] +
+                                         [2*cell+1 for cell in thirsty])
+        self.profiler.end("weather", started)
+        started = self.profiler.begin()
+        sunChance = self.getCurrentSunChance()
+        rainChance = self.getCurrentRainChance()
+        self.recordSunChance(turn, sunChance)
+        maxGrowth = PlantRegistry.maxGrowth
+        state = self.gameState
+
+        stillThirsty = set()
+        for cell, draw in zip(thirsty, draws[2*len(active):]):
+            moistureIndex = cell*CELL_DATA_SIZE+1
+            if draw < rainChance:
+                state[moistureIndex] = min(state[moistureIndex] + 127, 255)
+            if state[moistureIndex] < 255:
+                stillThirsty.add(cell)
+        self.thirstyCells = stillThirsty
+
+        for n, cell in enumerate(active):
+            cellIndex = cell*CELL_DATA_SIZE
+            state[cellIndex] = 255 if draws[2*n] < sunChance else 0
+            if draws[2*n+1] < rainChance:
+                state[cellIndex+1] = min(state[cellIndex+1] + 127, 255)
+            y, x = divmod(cell, self.width)
+            if self.checkGrowthConditions(x, y):
+                growthLevel = state[cellIndex+3] + 1
+                state[cellIndex+3] = growthLevel
+                if growthLevel >= maxGrowth[state[cellIndex+2]]:
+                    self.trackCell(cell)
+        self.profiler.end("growth", started)
+
     def checkGrowthConditions(self, x, y):
         cellIndex = self.getCellIndex(x, y)
         sun = self.gameState[cellIndex]
@@ -333,13 +3151,23 @@ class Game:
         definition = PlantRegistry.get_definition(plantType)
         if definition is None:
             return False
+        self.profiler.evaluated(definition.name)
+
+        evaluator = definition.compile()
+        if evaluator is not None:
+            if self.sameNeighbors is None:
+                same, adjacent = self.neighborCounts(x, y, plantType)
+            else:
+                cell = y*self.width + x
+                same, adjacent = self.sameNeighbors[cell], self.anyNeighbors[cell]
+            return evaluator.check(sun, moisture, same, adjacent, self.getTurnNumber(), self.activeWeatherEvents)
 
         def getNeighbors():
             directions = [(-1,0),(1,0),(0,-1),(0,1)]
             neighbors = []
             for dx, dy in directions:
                 nx, ny = x+dx, y+dy
-                if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
+                if self.inBounds(nx, ny):
                     nIndex = self.getCellIndex(nx, ny)
                     neighbors.append(self.gameState[nIndex+2])
             return neighbors
@@ -362,14 +3190,13 @@ class Game:
         if vc['type'] == 'reap_plants':
             if self.fullyGrownPlantsReaped >= vc['target']:
                 self.victoryConditionMet = True
-                print(f"Victory! You have reaped at least {vc['target']} fully grown plants.")
+                self.log(f"Victory! You have reaped at least {vc['target']} fully grown plants.")
 
     def handleScheduledEvents(self, turn):
-        for event in self.scenario['weatherPolicy']['events']:
-            if event['turn'] == turn:
+        for kind, event in self.scenario['timeline'].get(turn, ()):
+            if kind == "weather":
                 self.activateWeatherEvent(event)
-        for event in self.scenario['scheduledEvents']:
-            if event['turn'] == turn:
+            else:
                 self.handleEvent(event)
 
         to_remove = []
@@ -381,7 +3208,7 @@ class Game:
             del self.activeWeatherEvents[et]
 
     def activateWeatherEvent(self, event):
-        self.activeWeatherEvents[event['type']] = event.get('duration',1)
+        self.activeWeatherEvents[event['type']] = event['duration']
 
     def handleEvent(self, event):
         if event['action'] == 'unlock_plant_type' and 'plantType' in event:
@@ -391,17 +3218,24 @@ class Game:
         if plantType not in self.availablePlantTypes:
             self.availablePlantTypes.append(plantType)
 
+    def recordSunChance(self, turn, sunChance):
+        if sunChance != min(self.scenario['weatherPolicy']['sunChance'], 1.0):
+            self.eventSunChances[turn] = sunChance
+        else:
+            self.eventSunChances.pop(turn, None)
+
     def getCurrentSunChance(self):
         sunChance = self.scenario['weatherPolicy']['sunChance']
         if 'Drought' in self.activeWeatherEvents:
             sunChance += 0.2
         return min(sunChance, 1.0)
 
-    def getCurrentRainChance(self):
+    def getCurrentRainChance(self, events=None):
+        events = self.activeWeatherEvents if events is None else events
         rainChance = self.scenario['weatherPolicy']['rainChance']
-        if 'Drought' in self.activeWeatherEvents:
+        if 'Drought' in events:
             rainChance -= 0.3
-        if 'Rainstorm' in self.activeWeatherEvents:
+        if 'Rainstorm' in events:
             rainChance += 0.5
         if rainChance < 0: rainChance = 0
         if rainChance > 1: rainChance = 1
@@ -412,132 +3246,444 @@ class Game:
         while True:
             cmd = input("> ")
             self.handleInputCommand(cmd)
+            self.renderer.flush()
 
-    def draw(self):
-        plantChar = {
-            PlantType.NoneType: '.',
-            PlantType.Wheat: 'W',
-            PlantType.Corn: 'C',
-            PlantType.Rice: 'R'
-        }
-
-        playerX = self.getPlayerX()
-        playerY = self.getPlayerY()
-
-        # We'll use a fixed width for each cell and debug info for alignment
-        # Let's choose width=9 characters for each cell and each debug entry.
-        cell_width = 9
-
-        for y in range(GRID_HEIGHT):
-            row_data = []
-            debug_data = []
-            for x in range(GRID_WIDTH):
-                cellIndex = self.getCellIndex(x,y)
-                sun = self.gameState[cellIndex]
-                moisture = self.gameState[cellIndex+1]
-                pType = self.gameState[cellIndex+2]
-                growthLevel = self.gameState[cellIndex+3]
-
-                ch = plantChar[pType]
-                if x == playerX and y == playerY:
-                    ch = 'P'
-                
-                # If debug mode: append growth level to plant if there's a plant
-                display_cell = ch
-                if self.debugMode and pType != PlantType.NoneType:
-                    display_cell = f"{ch}{growthLevel}"
+    def log(self, message):
+        self.renderer.message(message)
 
-                # Format the cell with fixed width (right-aligned)
-                row_data.append(f"{display_cell:>{cell_width}}")
-
-                if self.debugMode:
-                    # Format sun/moist line too
-                    # Max length "S255M255"=8 chars, we have cell_width=9 is fine
-                    debug_str = f"S{sun}M{moisture}"
-                    debug_data.append(f"{debug_str:>{cell_width}}")
-
-            print("".join(row_data))
-            if self.debugMode:
-                print("".join(debug_data))
+    def draw(self):
+        started = self.profiler.begin()
+        self.renderer.draw(self)
+        self.profiler.end("draw", started)
 
-        print(f"Fully grown plants reaped: {self.fullyGrownPlantsReaped}")
-        if self.debugMode:
-            print("(Debug mode ON)")
+    def saveGame(self, saveName=None):
+        if saveName is None:
+            saveName = input("Enter a name for your save: ")
+        if saveName:
+            self.saves.save(saveName, self.history.entries, self.fullyGrownPlantsReaped, self.width, self.height,
+                            self.getTurnNumber(), self.eventSunChances, self.rng)
+            self.log(f'Game saved as "{saveName}"')
 
-    def saveGame(self):
-        saveName = input("Enter a name for your save: ")
+    def exportGame(self, saveName=None):
+        if saveName is None:
+            saveName = input("Enter a name for the JSON export: ")
         if saveName:
             saveData = {
-                "gameState": self.gameState,
-                "history": [list(st) for st in self.history],
-                "fullyGrownPlantsReaped": self.fullyGrownPlantsReaped
+                "gameState": self.stateToList(self.settledState()),
+                "history": [self.stateToList(self.settledState(snapshot)) for snapshot in self.history.snapshots()],
+                "fullyGrownPlantsReaped": self.fullyGrownPlantsReaped,
+                # Needed to work out the sun again after an import; see cellSuns
+                "sunChances": {str(turn): chance for turn, chance in self.eventSunChances.items()},
+                "rng": self.rng.kind,
+                "seed": self.rng.seed,
+                # Plant IDs depend on the order crop packs were loaded in
+                "plants": plant_names(),
             }
-            with open(f"{saveName}.json","w") as f:
+            with open(os.path.join(self.saveDir, f"{saveName}.json"),"w") as f:
                 json.dump(saveData, f)
-            print(f'Game saved as "{saveName}"')
-
-    def loadGame(self):
-        saveName = input("Enter the name of the save to load: ")
+            self.log(f'Game exported as "{saveName}.json"')
+
+    def loadGame(self, saveName=None):
+        if saveName is None:
+            slots = self.saves.slots()
+            for name, slot in sorted(slots.items(), key=lambda item: item[1]["saved"]):
+                self.log(f'  {name}: turn {slot["turn"]}, {slot["reaped"]} reaped, '
+                         f'{time.strftime("%Y-%m-%d %H:%M", time.localtime(slot["saved"]))}')
+            saveName = input("Enter the name of the save to load: ")
         if saveName:
-            if os.path.exists(f"{saveName}.json"):
-                with open(f"{saveName}.json","r") as f:
-                    parsedData = json.load(f)
-                self.gameState = parsedData["gameState"]
-                self.history = [list(st) for st in parsedData["history"]]
-                self.fullyGrownPlantsReaped = parsedData.get("fullyGrownPlantsReaped",0)
-                self.future = []
-                self.victoryConditionMet = False
-                self.draw()
-                print(f'Game "{saveName}" loaded.')
+            # Saves from before the save store are separate .sav or .json files
+            path = os.path.join(self.saveDir, saveName)
+            try:
+                loaded = self.saves.load(saveName, self.width, self.height, self.history.depth)
+                if loaded is None:
+                    loaded = read_save_file(f"{path}.sav", self.width, self.height, self.history.depth)
+                    if loaded is not None:
+                        history, reaped, _, sunChances, rng, _ = loaded
+                        loaded = history, reaped, sunChances, rng
+            except SaveError as e:
+                self.log(str(e))
+                return
+            if loaded is not None:
+                history, reaped, sunChances, rng = loaded
+                self.restoreGame(history.last[:], history, reaped, sunChances, rng)
+                self.log(f'Game "{saveName}" loaded.')
+            elif os.path.exists(f"{path}.json"):
+                self.loadJsonSave(f"{path}.json")
+                self.log(f'Game "{saveName}" loaded.')
             else:
-                print(f'Save "{saveName}" not found.')
+                self.log(f'Save "{saveName}" not found.')
+
+    def loadJsonSave(self, path):
+        with open(path,"r") as f:
+            parsedData = json.load(f)
+        if len(parsedData["gameState"]) != self.gridDataSize + JSON_TAIL_SIZE:
+            self.log(f'"{path}" was saved on a different grid size.')
+            return
+        try:
+            plantMap = plant_id_map(parsedData.get("plants"))
+        except SaveError as e:
+            self.log(str(e))
+            return
+        snapshots = [self.stateFromList(snapshot, plantMap) for snapshot in parsedData["history"]]
+        history = History.fromSnapshots(snapshots, self.history.depth)
+        sunChances = {int(turn): chance for turn, chance in parsedData.get("sunChances", {}).items()}
+        rng = make_rng(parsedData["rng"], parsedData["seed"]) if parsedData.get("rng") in RNG_KINDS else None
+        self.restoreGame(self.stateFromList(parsedData["gameState"], plantMap), history,
+                         parsedData.get("fullyGrownPlantsReaped",0), sunChances, rng)
+
+    def stateFromList(self, values, plantMap=None):
+        """Build a gameState from the JSON list layout, translating plant IDs with plantMap."""
+        grid = self.gridDataSize
+        x, y, turn = values[grid:grid+3]
+        if plantMap is not None:
+            values = list(values)
+            values[2:grid:CELL_DATA_SIZE] = [plantMap[value] for value in values[2:grid:CELL_DATA_SIZE]]
+        if not self.chunked:
+            return bytearray(values[:grid]) + STATE_TAIL.pack(x, y, turn)
+        state = ChunkedGrid(self.width, self.height)
+        for i in range(grid):
+            if values[i]:
+                state[i] = values[i]
+        state.tail[:] = STATE_TAIL.pack(x, y, turn)
+        return state
+
+    def stateToList(self, state):
+        tail = state.tail if self.chunked else state[self.gridDataSize:]
+        return list(state[:self.gridDataSize]) + list(STATE_TAIL.unpack(tail)) + [0]*(JSON_TAIL_SIZE-3)
+
+    def restoreGame(self, gameState, history, reaped, sunChances=None, rng=None):
+        """Switch to a loaded game. rng is the one it was saved with, which
+        idle cells' sun is drawn from; None (older saves) keeps the current one."""
+        self.setGameState(gameState)
+        self.history = history
+        # The autosave still holds the game before the load; have it write this one out in full
+        history.pending = None
+        if rng is not None and (rng.kind, rng.seed) != (self.rng.kind, self.rng.seed):
+            self.rng = rng
+            # The pool's workers draw weather from the seed they started with
+            if isinstance(self.engine, ParallelEngine):
+                self.engine.close()
+        self.eventSunChances = dict(sunChances or {})
+        self.rebuildCellIndexes()
+        self.fullyGrownPlantsReaped = reaped
+        self.victoryConditionMet = False
+        if self.replayLog is not None:
+            self.replayLog.checkpoint(self)
+        self.draw()
 
     def autoSaveGame(self):
-        autoSaveData = {
-            "gameState": self.gameState,
-            "history": [list(st) for st in self.history],
-            "fullyGrownPlantsReaped": self.fullyGrownPlantsReaped,
-        }
-        with open("autosave.json","w") as f:
-            json.dump(autoSaveData,f)
+        if self.autosave is None:
+            return
+        started = self.profiler.begin()
+        self.autosave.record(self.history, self.fullyGrownPlantsReaped, self.eventSunChances, self.rng)
+        self.profiler.end("autosave", started)
+
+    def hasAutoSave(self):
+        return self.autosave is not None and (
+            self.autosave.exists() or os.path.exists(os.path.join(self.saveDir, "autosave.json")))
 
     def checkAutoSave(self):
-        if os.path.exists("autosave.json"):
+        if self.hasAutoSave():
             ans = input("An auto-save was found. Do you want to continue where you left off? (y/n) ")
             if ans.lower().startswith('y'):
-                with open("autosave.json","r") as f:
-                    parsedData = json.load(f)
-                self.gameState = parsedData["gameState"]
-                self.history = [list(st) for st in parsedData["history"]]
-                self.fullyGrownPlantsReaped = parsedData.get("fullyGrownPlantsReaped",0)
-                self.future = []
-                self.victoryConditionMet = False
-                self.draw()
+                self.resumeAutoSave()
+
+    def resumeAutoSave(self):
+        """Continue from the autosave, falling back to a legacy autosave.json."""
+        try:
+            loaded = self.autosave.load(self.history.depth)
+        except SaveError as e:
+            self.log(f"Can't resume the autosave: {e}")
+            return
+        if loaded is not None:
+            history, reaped, sunChances, rng = loaded
+            self.restoreGame(history.last[:], history, reaped, sunChances, rng)
+        elif os.path.exists(os.path.join(self.saveDir, "autosave.json")):
+            self.loadJsonSave(os.path.join(self.saveDir, "autosave.json"))
 
     def undo(self):
-        if len(self.history) > 1:
-            self.future.append(self.history.pop())
-            self.gameState = list(self.history[-1])
+        if self.history is not None and self.history.undo(self.gameState, self.applyChanges):
             self.draw()
 
     def redo(self):
-        if len(self.future) > 0:
-            nextState = self.future.pop()
-            self.history.append(nextState)
-            self.gameState = list(nextState)
+        if self.history is not None and self.history.redo(self.gameState, self.applyChanges):
             self.draw()
 
     def pushStateToHistory(self):
-        if len(self.history) > 100:
-            self.history.pop(0)
-        self.history.append(list(self.gameState))
-
+        if self.history is None:
+            return
+        started = self.profiler.begin()
+        self.history.push(self.gameState)
+        self.profiler.end("history", started)
+
+    def state_hash(self):
+        """64-bit hash of the state as of the last history push, which every command ends with.
+
+        Equal states hash equal whatever path led to them; sun is left out
+        since it follows from the turn.
+        """
+        return self.history.hash if self.history is not None else zobrist_hash(self.gameState)
+
+    def fork(self, seed=None):
+        """A headless copy of the game to play a what-if branch on.
+
+        The child shares what it can with this game: chunked grids share
+        their tiles until either game writes to one, and dense grids switch
+        both games to a PagedGrid whose pages are shared the same way until
+        the next turn joins them back into one buffer. The history's last
+        state is paged too, the neighbor counts and the active and thirsty
+        cell sets are copied by whichever game changes them first, the
+        history shares its entries and the compiled scenario is shared
+        outright. A parallel game's cells are in its pool's shared memory,
+        so its forks copy them once. The
+        child has no autosave, replay log, renderer output or worker pool,
+        so dropping it is all there is to discarding it.
+
+        The child's rng is a new one of the same kind, seeded from this
+        game's seed and its fork count unless seed is given, so each fork
+        draws its own weather from the next turn on; fork twice with one
+        seed to compare two branches under the same weather. Up to the fork
+        turn it draws what this game does (see ForkedRng), so the sun of the
+        states they share comes out the same.
+        """
+        self.forks += 1
+        if seed is None:
+            seed = _splitmix64(self.rng.seed ^ _splitmix64(self.forks))
+        if isinstance(self.gameState, bytearray):
+            self.setGameState(PagedGrid(self.gameState))
+        child = Game.__new__(Game)
+        child.__dict__.update(self.__dict__)
+        child.setGameState(fork_state(self.gameState))
+        child.history = self.history.fork() if self.history is not None else None
+        child.availablePlantTypes = list(self.availablePlantTypes)
+        child.activeWeatherEvents = dict(self.activeWeatherEvents)
+        child.eventSunChances = dict(self.eventSunChances)
+        # The neighbor counts and the active and thirsty cell sets are copied by whichever game changes them first
+        if self.sameNeighbors is not None:
+            self.neighborCountsShared = child.neighborCountsShared = True
+        self.cellSetsShared = child.cellSetsShared = True
+        child.rng = ForkedRng(self.rng, make_rng(self.rng.kind, seed), self.getTurnNumber())
+        child.forks = 0
+        # A fork of a parallel game steps in-process rather than starting a pool of its own
+        child.engine = VectorizedEngine(child) if self.engine is not None else None
+        child.debugMode = False
+        child.headless = True
+        child.renderer = NullRenderer()
+        child.autosave = None
+        child.saves = SaveStore(self.saves.directory)
+        child.stats = Profiler()
+        child.profileFlag = False
+        child.profilePath = None
+        child.profiler = NULL_PROFILER
+        child.replayLog = None
+        return child
+
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+# Bump when the compiled form changes so stale on-disk caches are ignored
+SCENARIO_CACHE_VERSION = 2
+
+class ScenarioError(ValueError):
+    pass
+
+def _check_int(errors, where, value, low, high=None):
+    if not isinstance(value, int) or isinstance(value, bool) or value < low or (high is not None and value > high):
+        bound = f"between {low} and {high}" if high is not None else f"at least {low}"
+        errors.append(f"{where} must be an integer {bound}, got {value!r}")
+        return False
+    return True
+
+def _check_chance(errors, where, value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value <= 1:
+        errors.append(f"{where} must be a number between 0 and 1, got {value!r}")
+
+def _check_fields(errors, where, value, required):
+    if not isinstance(value, dict):
+        errors.append(f"{where} must be an object")
+        return False
+    missing = [key for key in required if key not in value]
+    for key in missing:
+        errors.append(f"{where}: missing '{key}'")
+    return not missing
+
+def validate_scenario(data):
+    """Every problem with a parsed scenario, as readable messages."""
+    errors = []
+    if not _check_fields(errors, "scenario", data, ("startingConditions", "weatherPolicy", "victoryCondition")):
+        return errors
+    packs = data.get('cropPacks', [])
+    if not isinstance(packs, list) or not all(isinstance(pack, str) for pack in packs):
+        errors.append(f"cropPacks must be a list of crop pack names, got {packs!r}")
+    else:
+        for pack in packs:
+            try:
+                load_crop_pack(pack)
+            except CropPackError as e:
+                errors.append(str(e))
+    plantNames = PlantRegistry.ids
+
+    sc = data['startingConditions']
+    if _check_fields(errors, "startingConditions", sc, ("playerPosition", "grid")):
+        width, height = GRID_WIDTH, GRID_HEIGHT
+        size = sc.get('gridSize', [width, height])
+        if not isinstance(size, list) or len(size) != 2:
+            errors.append(f"startingConditions.gridSize must be [width, height], got {size!r}")
+        elif all([_check_int(errors, "startingConditions.gridSize[0]", size[0], 1, 0xFFFF),
+                  _check_int(errors, "startingConditions.gridSize[1]", size[1], 1, 0xFFFF)]):
+            width, height = size
+            if width*height > MAX_GRID_CELLS:
+                errors.append(f"startingConditions.gridSize {width}x{height} has more than {MAX_GRID_CELLS} cells")
+        if sc.get('storage', "dense") not in ("dense", "chunked"):
+            errors.append(f"startingConditions.storage must be 'dense' or 'chunked', got {sc['storage']!r}")
+        _check_int(errors, "startingConditions.fullyGrownPlantsReaped", sc.get('fullyGrownPlantsReaped', 0), 0)
+
+        position = sc['playerPosition']
+        if not isinstance(position, list) or len(position) != 2:
+            errors.append(f"startingConditions.playerPosition must be [x, y], got {position!r}")
+        else:
+            _check_int(errors, "startingConditions.playerPosition[0]", position[0], 0, width-1)
+            _check_int(errors, "startingConditions.playerPosition[1]", position[1], 0, height-1)
 
-def load_scenario(name):
-    with open(f"scenarios/{name}.json","r") as f:
-        return json.load(f)
+        if not isinstance(sc['grid'], list):
+            errors.append("startingConditions.grid must be a list")
+        else:
+            for i, cell in enumerate(sc['grid']):
+                where = f"startingConditions.grid[{i}]"
+                if _check_fields(errors, where, cell, ("x", "y", "plantType", "growthLevel")):
+                    _check_int(errors, f"{where}.x", cell['x'], 0, width-1)
+                    _check_int(errors, f"{where}.y", cell['y'], 0, height-1)
+                    plantType = plantNames.get(str(cell['plantType']).lower())
+                    if plantType is None:
+                        errors.append(f"{where}.plantType: unknown plant type {cell['plantType']!r}")
+                    else:
+                        _check_int(errors, f"{where}.growthLevel", cell['growthLevel'], 0,
+                                   PlantRegistry.maxGrowth[plantType])
+
+        available = sc.get('availablePlantTypes', DEFAULT_PLANT_TYPES)
+        if not isinstance(available, list) or not available:
+            errors.append(f"startingConditions.availablePlantTypes must be a non-empty list, got {available!r}")
+        else:
+            for plantType in available:
+                if str(plantType).lower() not in plantNames:
+                    errors.append(f"startingConditions.availablePlantTypes: unknown plant type {plantType!r}")
+
+    wp = data['weatherPolicy']
+    if _check_fields(errors, "weatherPolicy", wp, ("sunChance", "rainChance", "events")):
+        _check_chance(errors, "weatherPolicy.sunChance", wp['sunChance'])
+        _check_chance(errors, "weatherPolicy.rainChance", wp['rainChance'])
+        if not isinstance(wp['events'], list):
+            errors.append("weatherPolicy.events must be a list")
+        else:
+            for i, event in enumerate(wp['events']):
+                where = f"weatherPolicy.events[{i}]"
+                if _check_fields(errors, where, event, ("turn", "type", "duration")):
+                    _check_int(errors, f"{where}.turn", event['turn'], 1)
+                    _check_int(errors, f"{where}.duration", event['duration'], 1)
+                    if not isinstance(event['type'], str):
+                        errors.append(f"{where}.type must be a string, got {event['type']!r}")
+
+    vc = data['victoryCondition']
+    if _check_fields(errors, "victoryCondition", vc, ("type", "target")):
+        if vc['type'] != 'reap_plants':
+            errors.append(f"victoryCondition.type: unknown victory condition {vc['type']!r}")
+        _check_int(errors, "victoryCondition.target", vc['target'], 1)
+
+    events = data.get('scheduledEvents', [])
+    if not isinstance(events, list):
+        errors.append("scheduledEvents must be a list")
+    else:
+        for i, event in enumerate(events):
+            where = f"scheduledEvents[{i}]"
+            if _check_fields(errors, where, event, ("turn", "action")):
+                _check_int(errors, f"{where}.turn", event['turn'], 1)
+                if event['action'] != 'unlock_plant_type':
+                    errors.append(f"{where}.action: unknown action {event['action']!r}")
+                elif str(event.get('plantType', "")).lower() not in plantNames:
+                    errors.append(f"{where}.plantType: unknown plant type {event.get('plantType')!r}")
+    return errors
+
+def compile_scenario(data, source="scenario"):
+    """Validate a parsed scenario and add its event timeline.
+
+    Returns a new dict with 'timeline' mapping each turn to its
+    ("weather" | "scheduled", event) pairs, so a turn only touches its own
+    events. The crop packs listed in 'cropPacks' are loaded on the way.
+    Raises ScenarioError listing every problem found. Already compiled
+    scenarios are returned as they are.
+    """
+    if 'timeline' in data:
+        # A compiled scenario from the disk cache still needs its crops registered
+        for pack in data.get('cropPacks', []):
+            load_crop_pack(pack)
+        return data
+    errors = validate_scenario(data)
+    if errors:
+        raise ScenarioError(f"{source} is not a valid scenario:\n  " + "\n  ".join(errors))
+
+    scenario = dict(data)
+    scenario.setdefault('scheduledEvents', [])
+    return _add_timeline(scenario)
+
+def _add_timeline(scenario):
+    timeline = {}
+    for event in scenario['weatherPolicy']['events']:
+        timeline.setdefault(event['turn'], []).append(("weather", event))
+    for event in scenario['scheduledEvents']:
+        timeline.setdefault(event['turn'], []).append(("scheduled", event))
+    scenario['timeline'] = timeline
+    return scenario
+
+_compiledScenarios = {}
+
+def load_scenario(name, directory=SCENARIO_DIR, cacheDir=None):
+    """Load and compile scenarios/name.json.
+
+    Compiled scenarios are kept in memory for the life of the process,
+    keyed on the file's size and mtime, and if cacheDir is given, written
+    there as JSON named by a hash of the file so other processes can skip
+    validation. The returned dict is shared; don't modify it.
+    """
+    path = os.path.abspath(os.path.join(directory, f"{name}.json"))
+    info = os.stat(path)
+    key = (path, info.st_size, info.st_mtime_ns)
+    scenario = _compiledScenarios.get(key)
+    if scenario is not None:
+        return scenario
+
+    with open(path, "rb") as f:
+        source = f.read()
+    cachePath = None
+    if cacheDir is not None:
+        cachePath = os.path.join(cacheDir, f"{name}-{hashlib.sha256(source).hexdigest()[:32]}.json")
+        try:
+            with open(cachePath, "r") as f:
+                cached = json.load(f)
+            if cached.get("version") == SCENARIO_CACHE_VERSION:
+                scenario = compile_scenario(_add_timeline(cached["scenario"]))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            scenario = None
+
+    if scenario is None:
+        try:
+            data = json.loads(source)
+        except ValueError as e:
+            raise ScenarioError(f"{path} is not valid JSON: {e}") from None
+        scenario = compile_scenario(data, path)
+        if cachePath is not None:
+            os.makedirs(cacheDir, exist_ok=True)
+            validated = {field: value for field, value in scenario.items() if field != 'timeline'}
+            write_file_atomic(cachePath, [json.dumps({"version": SCENARIO_CACHE_VERSION, "scenario": validated}).encode()])
+
+    _compiledScenarios[key] = scenario
+    return scenario
 
 def main():
+    parser = argparse.ArgumentParser(description="Farming game")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="time every turn phase and command; print a summary on quit and write it to FILE as JSON")
+    parser.add_argument("--record", metavar="FILE", help="log every command to FILE for replay.py")
+    args = parser.parse_args()
+
     print("Welcome to the Farming Game (Python Version)!")
     print("Choose a scenario:")
     print("1. Easy Start")
@@ -550,9 +3696,13 @@ def main():
         '3': 'survival_challenge'
     }
     scenario_key = scenario_name_map.get(choice, 'easy_start')
-    scenario = load_scenario(scenario_key)
+    try:
+        scenario = load_scenario(scenario_key)
+    except ScenarioError as e:
+        print(e)
+        sys.exit(1)
 
-    game = Game(scenario)
+    game = Game(scenario, profile=args.profile is not None, profilePath=args.profile or None, replayPath=args.record)
 
     print("""
     Instructions:
@@ -587,7 +3737,10 @@ def main():
     - Undo: 'undo'
     - Redo: 'redo'
     - Next Turn: 'n'
-    - Debug Mode: 'debug' toggles numeric data
+    - Fast-forward: 'advance N' runs N turns at once
+    - Debug Mode: 'debug' toggles numeric data and profiling
+    - Profile: 'profile' shows timings, 'profile export FILE' writes them as JSON
+    - Export: 'export' writes the game as a JSON save ('export NAME' skips the prompt)
     - Quit: 'q'
 
     Press Enter to start playing...
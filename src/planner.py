@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import argparse
+import heapq
+import statistics
+import sys
+import time
+from array import array
+
+from main import (CELL_DATA_SIZE, RNG_KINDS, SCENARIO_DIR, Game, ScenarioError, changed_indices, load_scenario,
+                  make_rng, zobrist_hash, zobrist_update)
+
+DIRECTIONS = ["up", "down", "left", "right"]
+# Everything but 'n', which the search runs separately to end each turn
+ACTIONS = ['w', 'a', 's', 'd'] + [f"sow {d}" for d in DIRECTIONS] + [f"reap {d}" for d in DIRECTIONS]
+DEFAULT_BEAM_WIDTH = 64
+DEFAULT_ACTIONS_PER_TURN = 12
+DEFAULT_MAX_TURNS = 1000
+
+class Node:
+    """A searched state, kept as the bytes its command changed in its parent's state."""
+    __slots__ = ("parent", "command", "depth", "order", "indices", "oldValues", "newValues", "hash",
+                 "reaped", "turn", "growth", "events", "plantTypes")
+
+    def __init__(self, parent, command, indices, oldValues, newValues, stateHash, reaped, turn, growth,
+                 events, plantTypes, order=0):
+        self.parent = parent
+        self.command = command
+        self.depth = parent.depth + 1 if parent is not None else 0
+        # Creation order, which keeps neighbors in the tree close together
+        self.order = order
+        self.indices = indices
+        self.oldValues = oldValues
+        self.newValues = newValues
+        self.hash = stateHash
+        self.reaped = reaped
+        self.turn = turn
+        # Sum of every plant's growth level, the search's measure of progress between reaps
+        self.growth = growth
+        # Weather events and plant types, shared with the parent unless the command changed them
+        self.events = events
+        self.plantTypes = plantTypes
+
+    def commands(self):
+        node, commands = self, []
+        while node.parent is not None:
+            commands.append(node.command)
+            node = node.parent
+        return commands[::-1]
+
+def score(node):
+    return (node.reaped, node.growth, -node.depth)
+
+class Planner:
+    """Beam search over commands for the fewest turns to a scenario's victory.
+
+    Weather comes from one seeded rng, so a search plans against one sampled
+    weather; plan several seeds for the spread. There is only one game
+    state: each node keeps just the bytes its command changed, and the game
+    is moved between nodes by writing those back along the tree. States
+    already reached (by hash and plants reaped) are dropped through a
+    transposition table, which also covers commands that change nothing.
+
+    The search goes a turn at a time. Within a turn it runs up to
+    actionsPerTurn layers of moves, sows and reaps, keeping the beamWidth
+    best children of each layer (most reaped, then most growth). The
+    beamWidth best states seen in the turn then take 'n' into the next one.
+    The first victory is in the fewest turns the beam saw, which is not a
+    proven minimum: the beam can drop the way to a faster one.
+    """
+    def __init__(self, scenario, rng, beamWidth=DEFAULT_BEAM_WIDTH, actionsPerTurn=DEFAULT_ACTIONS_PER_TURN,
+                 maxTurns=DEFAULT_MAX_TURNS, maxNodes=None):
+        self.game = Game(scenario, headless=True, rng=rng, historyDepth=0)
+        self.beamWidth = beamWidth
+        self.actionsPerTurn = actionsPerTurn
+        self.maxTurns = maxTurns
+        self.maxNodes = maxNodes
+        game = self.game
+        state = game.gameState
+        growth = sum(state[i] for i in range(3, game.gridDataSize, CELL_DATA_SIZE)) if not game.chunked else \
+            sum(chunk.data[i] for chunk in state.chunks.values() for i in range(3, len(chunk.data), CELL_DATA_SIZE))
+        self.root = Node(None, None, array('I'), array('B'), array('B'), zobrist_hash(state),
+                         game.fullyGrownPlantsReaped, game.getTurnNumber(), growth,
+                         dict(game.activeWeatherEvents), tuple(game.availablePlantTypes))
+        # The state of current, which commands are diffed against
+        self.base = state[:]
+        self.current = self.root
+        self.table = {(self.root.hash, self.root.reaped)}
+        self.goal = None
+        self.nodes = 0
+        self.seconds = 0.0
+
+    def write(self, indices, values):
+        self.game.applyChanges(indices, values)
+        base = self.base
+        for i, value in zip(indices, values):
+            base[i] = value
+
+    def moveTo(self, node):
+        """Rewrite the game from current's state to node's."""
+        up, down = self.current, node
+        path = []
+        while up is not down:
+            if up.depth >= down.depth:
+                self.write(up.indices, up.oldValues)
+                up = up.parent
+            else:
+                path.append(down)
+                down = down.parent
+        for step in reversed(path):
+            self.write(step.indices, step.newValues)
+        self.current = node
+        self.restoreExtras(node)
+
+    def restoreExtras(self, node):
+        game = self.game
+        game.fullyGrownPlantsReaped = node.reaped
+        game.victoryConditionMet = False
+        game.activeWeatherEvents = dict(node.events)
+        game.availablePlantTypes[:] = node.plantTypes
+
+    def expand(self, node, commands, children):
+        """Append node's unseen children by commands to children; sets goal on a victory."""
+        self.moveTo(node)
+        game = self.game
+        state, base = game.gameState, self.base
+        gridDataSize = game.gridDataSize
+        for command in commands:
+            game.handleInputCommand(command)
+            self.nodes += 1
+            indices = changed_indices(state, base)
+            reaped = game.fullyGrownPlantsReaped
+            if indices or reaped != node.reaped:
+                oldValues = array('B', [base[i] for i in indices])
+                newValues = array('B', [state[i] for i in indices])
+                stateHash = zobrist_update(node.hash, indices, oldValues, newValues, gridDataSize)
+                if (stateHash, reaped) not in self.table:
+                    self.table.add((stateHash, reaped))
+                    growth = node.growth + sum(new - old for i, old, new in zip(indices, oldValues, newValues)
+                                               if i < gridDataSize and i % CELL_DATA_SIZE == 3)
+                    events = node.events if game.activeWeatherEvents == node.events else dict(game.activeWeatherEvents)
+                    plantTypes = node.plantTypes if len(game.availablePlantTypes) == len(node.plantTypes) else \
+                        tuple(game.availablePlantTypes)
+                    child = Node(node, command, indices, oldValues, newValues, stateHash, reaped,
+                                 game.getTurnNumber(), growth, events, plantTypes, self.nodes)
+                    children.append(child)
+                    if game.victoryConditionMet:
+                        self.goal = child
+                game.applyChanges(indices, oldValues)
+            if command == 'n' or reaped != node.reaped or game.victoryConditionMet:
+                self.restoreExtras(node)
+            if self.goal is not None:
+                return
+
+    def expandAll(self, nodes, commands):
+        """Children of nodes by commands, or None once there is a victory or the node budget is spent."""
+        children = []
+        for node in nodes:
+            self.expand(node, commands, children)
+            if self.goal is not None or (self.maxNodes is not None and self.nodes >= self.maxNodes):
+                return None
+        return children
+
+    def best(self, nodes):
+        # Expand in the order the nodes were made, so each move between them is short
+        return sorted(heapq.nlargest(self.beamWidth, nodes, key=score), key=lambda node: node.order)
+
+    def search(self):
+        """The commands of the fastest victory found, or None if there was none within the limits."""
+        started = time.perf_counter()
+        layer = [self.root]
+        for _ in range(self.maxTurns):
+            seen = list(layer)
+            frontier = layer
+            for _ in range(self.actionsPerTurn):
+                children = self.expandAll(frontier, ACTIONS)
+                if not children:
+                    break
+                frontier = self.best(children)
+                seen += frontier
+            if children is None:
+                break
+            layer = self.expandAll(self.best(seen), ['n'])
+            if not layer:
+                break
+        self.seconds = time.perf_counter() - started
+        return self.goal.commands() if self.goal is not None else None
+
+    def nodesPerSecond(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+def replay_plan(scenario, rng, commands):
+    """Play commands in a fresh game; returns (victory, turns)."""
+    game = Game(scenario, headless=True, rng=rng)
+    for command in commands:
+        game.handleInputCommand(command)
+    return game.victoryConditionMet, game.getTurnNumber()
+
+def main():
+    parser = argparse.ArgumentParser(description="Search for the fewest turns to each scenario's victory.")
+    parser.add_argument("--scenarios", nargs="+", default=["easy_start", "drought_challenge", "survival_challenge"])
+    parser.add_argument("--seeds", type=int, default=1, help="sampled weathers to plan against per scenario")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--rng", choices=sorted(RNG_KINDS), default="counter", help="game random number generator")
+    parser.add_argument("--beam-width", type=int, default=DEFAULT_BEAM_WIDTH, help="states kept per search layer")
+    parser.add_argument("--actions-per-turn", type=int, default=DEFAULT_ACTIONS_PER_TURN,
+                        help="moves, sows and reaps searched between turns")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS, help="longest plan to search for, in turns")
+    parser.add_argument("--max-nodes", type=int, help="stop each search after expanding this many nodes")
+    parser.add_argument("--show-plan", action="store_true", help="print the commands of each plan")
+    parser.add_argument("--scenario-dir", default=SCENARIO_DIR)
+    parser.add_argument("--scenario-cache", help="directory to keep compiled scenarios in between runs")
+    args = parser.parse_args()
+
+    scenarios = {}
+    for name in args.scenarios:
+        try:
+            scenarios[name] = load_scenario(name, args.scenario_dir, args.scenario_cache)
+        except (ScenarioError, OSError) as e:
+            parser.error(str(e))
+
+    failed = False
+    for name, scenario in scenarios.items():
+        turns = []
+        for seed in range(args.first_seed, args.first_seed + args.seeds):
+            planner = Planner(scenario, make_rng(args.rng, seed), args.beam_width, args.actions_per_turn,
+                              args.max_turns, args.max_nodes)
+            plan = planner.search()
+            stats = (f"{planner.nodes} nodes in {planner.seconds:.2f} s, {planner.nodesPerSecond():.0f} nodes/s, "
+                     f"{len(planner.table)} states")
+            if plan is None:
+                print(f"{name} seed {seed}: no victory found; {stats}")
+                failed = True
+                continue
+            victory, turn = replay_plan(scenario, make_rng(args.rng, seed), plan)
+            if not victory:
+                print(f"{name} seed {seed}: plan did not replay to a victory", file=sys.stderr)
+                sys.exit(1)
+            turns.append(turn)
+            print(f"{name} seed {seed}: victory in {turn} turns, {len(plan)} commands; {stats}")
+            if args.show_plan:
+                print("  " + ", ".join(plan))
+        if len(turns) > 1:
+            print(f"{name}: {min(turns)} to {max(turns)} turns, mean {statistics.mean(turns):.1f}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+
+from main import FullRenderer, Replay
+
+def show(replay, command):
+    game = replay.game
+    print(f"After command {command} of {len(replay)}, turn {game.getTurnNumber()}, "
+          f"{game.fullyGrownPlantsReaped} reaped")
+    FullRenderer().draw(game)
+
+def verify(replay):
+    """Replay every command from the start and check each checkpoint matches; returns the mismatches."""
+    fresh = Replay(replay.path)
+    # Restoring only the first checkpoint means everything else is replayed
+    fresh.checkpoints = fresh.checkpoints[:1]
+    mismatches = []
+    for commands, _ in replay.checkpoints[1:]:
+        if fresh.seek(commands).state_hash() != replay.seek(commands).state_hash():
+            mismatches.append(commands)
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and seek through a replay log written with main.py --record.")
+    parser.add_argument("log")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--turn", type=int, help="show the farm when it first reached this turn")
+    where.add_argument("--command", type=int, help="show the farm after this many commands")
+    parser.add_argument("--list", action="store_true", help="print every logged command with the turn after it")
+    parser.add_argument("--verify", action="store_true", help="check replaying from the start matches every checkpoint")
+    args = parser.parse_args()
+
+    try:
+        replay = Replay(args.log)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    print(f"{args.log}: {replay.metadata['scenario']['scenarioName']}, {replay.metadata['rng']} rng seed "
+          f"{replay.metadata['seed']}, {len(replay)} commands, {len(replay.checkpoints)} checkpoints, "
+          f"{os.path.getsize(args.log)} bytes")
+    if args.list:
+        for index, turn in enumerate(replay.turns):
+            print(f"{index+1:>6} turn {turn:>6}  {replay.commandText(index)}")
+    if args.turn is not None:
+        replay.seekTurn(args.turn)
+        show(replay, replay.position[0])
+    elif args.command is not None:
+        replay.seek(args.command)
+        show(replay, replay.position[0])
+    if args.verify:
+        mismatches = verify(replay)
+        if mismatches:
+            print(f"Replay diverged at checkpoint(s) after command {', '.join(map(str, mismatches))}")
+            sys.exit(1)
+        print(f"Replay matches all {len(replay.checkpoints)} checkpoints")
+
+if __name__ == "__main__":
+    main()
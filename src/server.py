@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+from main import AutoSaveWriter, FullRenderer, Game, Profiler, SCENARIO_DIR, ScenarioError, load_scenario
+
+# Session and export names double as directory and file names
+NAME = re.compile(r"[A-Za-z0-9_-]{1,64}$")
+DEFAULT_SCENARIO = "easy_start"
+# Every reply ends with a line holding just this
+END_OF_REPLY = "."
+GREETING = "Farming game server. 'join NAME [SCENARIO]' to start or resume a farm, 'stats', 'quit'."
+
+class Session:
+    """One farm: a game drawing into whatever stream the server hands it."""
+    __slots__ = ("name", "game", "renderer", "attached", "lastUsed", "bytes")
+
+    def __init__(self, name, game, renderer, bytes=None):
+        self.name = name
+        self.game = game
+        self.renderer = renderer
+        self.attached = False
+        self.lastUsed = time.monotonic()
+        # Memory allocated while creating the session, when tracemalloc is on
+        self.bytes = bytes
+
+class GameServer:
+    """Hosts many games in one process over a line protocol.
+
+    A connection joins a session by name and then sends game commands one
+    per line; each reply ends with a "." line. Sessions outlive their
+    connections, so a farm can be resumed by joining it again. Each session
+    saves under its own directory in saveRoot, and every session shares the
+    compiled scenarios (cached by load_scenario), the plant registry and one
+    AutoSaveWriter thread that batches all their autosaves.
+
+    Sessions left detached for idleTimeout seconds are dropped from memory;
+    their autosave brings them back on the next join.
+    """
+    def __init__(self, saveRoot, scenarioDir=SCENARIO_DIR, cacheDir=None, idleTimeout=None):
+        self.saveRoot = saveRoot
+        self.scenarioDir = scenarioDir
+        self.cacheDir = cacheDir
+        self.idleTimeout = idleTimeout
+        self.sessions = {}
+        self.writer = AutoSaveWriter()
+        # Latency of every game command across all sessions, by command name
+        self.profiler = Profiler()
+        self.evicted = 0
+
+    def join(self, name, scenarioName=None):
+        """The session called name, created (or resumed from its autosave) if it isn't loaded."""
+        session = self.sessions.get(name)
+        if session is not None:
+            return session
+        scenario = load_scenario(scenarioName or DEFAULT_SCENARIO, self.scenarioDir, self.cacheDir)
+        saveDir = os.path.join(self.saveRoot, name)
+        os.makedirs(saveDir, exist_ok=True)
+        tracing = tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if tracing else None
+        # Resuming draws the farm; the join reply draws it again
+        renderer = FullRenderer(io.StringIO())
+        game = Game(scenario, renderer=renderer, saveDir=saveDir, saveWriter=self.writer)
+        if game.hasAutoSave():
+            game.resumeAutoSave()
+        renderer.out = None
+        session = Session(name, game, renderer,
+                          tracemalloc.get_traced_memory()[0] - before if tracing else None)
+        self.sessions[name] = session
+        return session
+
+    def run(self, session, command):
+        """Run one game command and return what the game printed."""
+        out = session.renderer.out = io.StringIO()
+        parts = command.split()
+        try:
+            if parts[0] == 'export' and (len(parts) != 2 or not NAME.match(parts[1])):
+                out.write("Specify a name of letters, digits, '-' or '_': export NAME\n")
+            elif parts[:2] == ['profile', 'export'] and (len(parts) != 3 or not NAME.match(parts[2])):
+                # Profiles are written in the session's directory, so only a bare name is allowed
+                out.write("Specify a name of letters, digits, '-' or '_': profile export NAME\n")
+            else:
+                started = self.profiler.begin()
+                session.game.handleInputCommand(command)
+                self.profiler.command(parts[0], started)
+        finally:
+            session.renderer.out = None
+            session.lastUsed = time.monotonic()
+        return out.getvalue()
+
+    def stats(self):
+        attached = sum(session.attached for session in self.sessions.values())
+        measured = [session.bytes for session in self.sessions.values() if session.bytes is not None]
+        stats = {
+            "sessions": len(self.sessions),
+            "attached": attached,
+            "evicted": self.evicted,
+            "commands": self.profiler.toJson()["commands"],
+        }
+        if tracemalloc.is_tracing():
+            stats["tracedBytes"] = tracemalloc.get_traced_memory()[0]
+            stats["sessionBytesMean"] = sum(measured) / len(measured) if measured else None
+        return stats
+
+    def evictIdle(self):
+        """Drop detached sessions idle for longer than idleTimeout."""
+        cutoff = time.monotonic() - self.idleTimeout
+        for name in [name for name, session in self.sessions.items()
+                     if not session.attached and session.lastUsed < cutoff]:
+            del self.sessions[name]
+            self.evicted += 1
+
+    async def evictLoop(self):
+        while True:
+            await asyncio.sleep(self.idleTimeout / 2)
+            self.evictIdle()
+
+    def close(self):
+        self.writer.flush()
+
+    async def handle(self, reader, writer):
+        session = None
+
+        def reply(text):
+            if text and not text.endswith("\n"):
+                text += "\n"
+            writer.write(f"{text}{END_OF_REPLY}\n".encode())
+
+        reply(GREETING)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.decode(errors="replace").split()
+                if not parts:
+                    reply("")
+                elif parts[0] == 'join':
+                    if len(parts) not in (2, 3) or not all(NAME.match(part) for part in parts[1:]):
+                        reply("Usage: join NAME [SCENARIO], NAME of letters, digits, '-' or '_'")
+                    elif parts[1] in self.sessions and self.sessions[parts[1]].attached:
+                        reply(f'Farm "{parts[1]}" is already in use.')
+                    else:
+                        try:
+                            joined = self.join(parts[1], parts[2] if len(parts) == 3 else None)
+                        except (ScenarioError, OSError) as e:
+                            reply(str(e))
+                        else:
+                            if session is not None:
+                                session.attached = False
+                            session = joined
+                            session.attached = True
+                            reply(self.draw(session))
+                elif parts[0] == 'stats':
+                    reply(json.dumps(self.stats(), indent=2))
+                elif parts[0] in ('quit', 'q'):
+                    reply("Bye.")
+                    break
+                elif session is None:
+                    reply("Join a farm first: join NAME [SCENARIO]")
+                else:
+                    reply(self.run(session, " ".join(parts)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if session is not None:
+                session.attached = False
+                session.lastUsed = time.monotonic()
+            writer.close()
+
+    def draw(self, session):
+        out = session.renderer.out = io.StringIO()
+        try:
+            session.game.draw()
+        finally:
+            session.renderer.out = None
+        return out.getvalue()
+
+async def serve(server, host, port, unixPath):
+    if unixPath:
+        listener = await asyncio.start_unix_server(server.handle, path=unixPath)
+        where = unixPath
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        where = ", ".join(str(sock.getsockname()) for sock in listener.sockets)
+    print(f"Serving on {where}", file=sys.stderr)
+    if server.idleTimeout:
+        asyncio.get_running_loop().create_task(server.evictLoop())
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many farming game sessions over a line protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--save-root", default="sessions", help="directory holding one save directory per session")
+    parser.add_argument("--scenario-dir", default=SCENARIO_DIR)
+    parser.add_argument("--scenario-cache", help="directory to keep compiled scenarios in between runs")
+    parser.add_argument("--idle-timeout", type=float, help="drop detached sessions from memory after this many seconds")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="measure memory per session with tracemalloc (slower); shown by 'stats'")
+    args = parser.parse_args()
+
+    if args.trace_memory:
+        tracemalloc.start()
+    server = GameServer(args.save_root, args.scenario_dir, args.scenario_cache, args.idle_timeout)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import sys
+
+from main import Game, PlantRegistry, PlantType, CELL_DATA_SIZE, RNG_KINDS, SCENARIO_DIR, ScenarioError, load_scenario, make_rng
+
+DIRECTIONS = {"up": (0,-1), "down": (0,1), "left": (-1,0), "right": (1,0)}
+MOVES = ['w','a','s','d']
+# Scripts that never advance time would loop forever; stop after this many commands per turn
+MAX_COMMANDS_PER_TURN = 100
+
+# Policies pick the next command from the game state and the run's own RNG
+def random_policy(game, rng):
+    return rng.choice(MOVES + [f"sow {d}" for d in DIRECTIONS] + [f"reap {d}" for d in DIRECTIONS] + ['n'])
+
+def greedy_policy(game, rng):
+    """Reap anything ripe next to the player, sow empty neighbors, wander a bit, else wait."""
+    x, y = game.getPlayerX(), game.getPlayerY()
+    empty = []
+    for name, (dx, dy) in DIRECTIONS.items():
+        nx, ny = x+dx, y+dy
+        if game.inBounds(nx, ny):
+            cellIndex = game.getCellIndex(nx, ny)
+            if game.gameState[cellIndex+2] == PlantType.NoneType:
+                empty.append(name)
+            elif game.gameState[cellIndex+3] >= PlantRegistry.maxGrowth[game.gameState[cellIndex+2]]:
+                return f"reap {name}"
+    if empty and rng.random() < 0.5:
+        return f"sow {rng.choice(empty)}"
+    if rng.random() < 0.3:
+        return rng.choice(MOVES)
+    return 'n'
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+def script_policy(commands):
+    commands = iter(commands)
+    return lambda game, rng: next(commands, 'n')
+
+def growth_histogram(game):
+    counts = [0, 0, 0, 0]
+    state = game.gameState
+    # Chunked grids only hold the tiles that were touched; off-grid padding cells are empty
+    blocks = [chunk.data for chunk in state.chunks.values()] if game.chunked else [state[:game.gridDataSize]]
+    for cells in blocks:
+        for cellIndex in range(0, len(cells), CELL_DATA_SIZE):
+            if cells[cellIndex+2] != PlantType.NoneType:
+                counts[min(cells[cellIndex+3], 3)] += 1
+    return counts
+
+def run_simulation(job):
+    """Play one seeded run with no rendering and return its summary."""
+    scenarioName, seed, turns, policyName, script, rngKind, scenarioDir, cacheDir = job
+    # The game's weather and sowing draws and the policy's choices use separate streams
+    rng = random.Random(f"policy-{seed}")
+    policy = script_policy(script) if script is not None else POLICIES[policyName]
+
+    game = Game(load_scenario(scenarioName, scenarioDir, cacheDir), headless=True, rng=make_rng(rngKind, seed))
+    commands = 0
+    turnsToVictory = None
+    while game.getTurnNumber() < turns and commands < turns*MAX_COMMANDS_PER_TURN:
+        cmd = policy(game, rng)
+        if cmd.strip() == 'q':
+            break
+        game.handleInputCommand(cmd)
+        commands += 1
+        if game.victoryConditionMet:
+            turnsToVictory = game.getTurnNumber()
+            break
+
+    return {
+        "scenario": scenarioName,
+        "seed": seed,
+        "rng": rngKind,
+        "policy": "script" if script is not None else policyName,
+        "turns": game.getTurnNumber(),
+        "commands": commands,
+        "victory": game.victoryConditionMet,
+        "turnsToVictory": turnsToVictory,
+        "plantsReaped": game.fullyGrownPlantsReaped,
+        "growthHistogram": growth_histogram(game),
+    }
+
+def run_batch(scenarios, seeds, turns, policy="greedy", script=None, workers=None,
+              rngKind="counter", scenarioDir=SCENARIO_DIR, cacheDir=None):
+    """Yield one result per (scenario, seed) as runs finish, spread over a process pool."""
+    # Compile every scenario up front so a bad file fails before any work starts,
+    # and so cacheDir is populated before the workers look in it
+    for name in scenarios:
+        load_scenario(name, scenarioDir, cacheDir)
+    jobs = [(name, seed, turns, policy, script, rngKind, scenarioDir, cacheDir) for name in scenarios for seed in seeds]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(run_simulation, jobs)
+        return
+    chunksize = max(1, len(jobs) // (workers*8))
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(run_simulation, jobs, chunksize)
+
+CSV_FIELDS = ["scenario", "seed", "rng", "policy", "turns", "commands", "victory", "turnsToVictory",
+              "plantsReaped", "growth0", "growth1", "growth2", "growth3"]
+
+def write_results(results, out, fmt):
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+    for result in results:
+        if fmt == "csv":
+            row = {k: v for k, v in result.items() if k != "growthHistogram"}
+            for level, count in enumerate(result["growthHistogram"]):
+                row[f"growth{level}"] = count
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(result) + "\n")
+        out.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless farming game simulations in parallel.")
+    parser.add_argument("--scenarios", nargs="+", default=["easy_start", "drought_challenge", "survival_challenge"])
+    parser.add_argument("--seeds", type=int, default=100, help="number of seeded runs per scenario")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--turns", type=int, default=100, help="turn limit per run")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--script", help="file of commands, one per line, played instead of a policy")
+    parser.add_argument("--rng", choices=sorted(RNG_KINDS), default="counter", help="game random number generator")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--output", help="results file (default: stdout)")
+    parser.add_argument("--scenario-dir", default=SCENARIO_DIR)
+    parser.add_argument("--scenario-cache", help="directory to keep compiled scenarios in between runs")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r") as f:
+            script = [line.strip() for line in f if line.strip()]
+
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    for name in args.scenarios:
+        try:
+            load_scenario(name, args.scenario_dir, args.scenario_cache)
+        except (ScenarioError, OSError) as e:
+            parser.error(str(e))
+
+    results = run_batch(args.scenarios, seeds, args.turns, args.policy, script, args.workers,
+                        args.rng, args.scenario_dir, args.scenario_cache)
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            write_results(results, out, args.format)
+    else:
+        write_results(results, sys.stdout, args.format)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import copy
+import random
+
+import pytest
+
+import main
+from main import Game, load_scenario, make_rng
+
+def scenario(name, width, height):
+    scenario = copy.deepcopy(load_scenario(name))
+    scenario['startingConditions']['gridSize'] = [width, height]
+    scenario['victoryCondition']['target'] = 10**9
+    return scenario
+
+def planted(name, width, height, seed=1):
+    """A scenario with plants spread over the grid, at least one in every chunked tile."""
+    scenario = copy.deepcopy(load_scenario(name))
+    r = random.Random(seed)
+    cells = {(x, y) for x in range(3, width, main.CHUNK_SIZE) for y in range(3, height, main.CHUNK_SIZE)}
+    cells |= {(r.randrange(width), r.randrange(height)) for _ in range(width*height//4)}
+    scenario['startingConditions']['gridSize'] = [width, height]
+    scenario['startingConditions']['grid'] = [{"x": x, "y": y, "plantType": r.choice(["Wheat", "Corn", "Rice"]),
+                                               "growthLevel": 0} for x, y in sorted(cells)]
+    scenario['victoryCondition']['target'] = 10**9
+    return scenario
+
+def cell_fields(game, cells, fields):
+    state = game.settledState()
+    return [[state[cell*4 + field] for field in fields] for cell in cells]
+
+@pytest.mark.parametrize("rng", ["counter", "stdlib"])
+@pytest.mark.parametrize("name", ["easy_start", "drought_challenge"])
+def test_chunked_tiles_catch_up_on_rain(name, rng):
+    games = [Game(scenario(name, 100, 100), headless=True, backend=backend, rng=make_rng(rng, 5))
+             for backend in ("dense", "chunked")]
+    for game in games:
+        for _ in range(10):
+            game.handleInputCommand('n')
+        # The first plant in a tile that has had no weather so far
+        game.setPlayerPosition(71, 71)
+        for command in ['sow up', 'n', 'n', 'a', 'sow up', 'undo', 'redo', 'advance 20']:
+            game.handleInputCommand(command)
+    dense, chunked = games
+    cells = range(dense.cellCount)
+    assert cell_fields(chunked, cells, (2, 3)) == cell_fields(dense, cells, (2, 3))
+    # Tiles without plants don't get weather, so only compare the ones that do
+    weathered = chunked.weatheredCells()
+    assert len(weathered) > 0
+    assert cell_fields(chunked, weathered, (0, 1)) == cell_fields(dense, weathered, (0, 1))
+
+def cell_indexes(game):
+    same = bytes(game.sameNeighbors) if game.sameNeighbors is not None else None
+    anyCount = bytes(game.anyNeighbors) if game.anyNeighbors is not None else None
+    return same, anyCount, set(game.activeCells), set(game.thirstyCells)
+
+@pytest.mark.parametrize("bulk", [0, 10**9])
+@pytest.mark.parametrize("backend", ["dense", "chunked"])
+def test_undo_keeps_cell_indexes(monkeypatch, backend, bulk):
+    # bulk 0 sends every undo through the full rebuild, 10**9 none of them
+    monkeypatch.setattr(main, "BULK_CHANGE_CELLS", bulk)
+    game = Game(scenario("easy_start", 40, 40), headless=True, backend=backend, rng=make_rng("counter", 5))
+    # Undo and redo across keyframes too
+    game.history.keyframeInterval = 3
+    commands = ['sow up', 'n', 'sow left', 'n', 'n', 'reap up', 'n', 'd', 'sow right', 'n', 'sow down', 'n']
+    for command in commands + ['undo', 'undo', 'undo', 'redo', 'undo', 'undo', 'undo', 'undo', 'redo', 'redo', 'n']:
+        game.handleInputCommand(command)
+        indexes = cell_indexes(game)
+        game.rebuildCellIndexes()
+        assert indexes == cell_indexes(game), command
+
+def outcome(game):
+    state = game.settledState()
+    return (bytes(state[i] for i in range(len(state))), game.fullyGrownPlantsReaped,
+            sorted(game.activeCells), sorted(game.thirstyCells))
+
+def play(game, seed):
+    r = random.Random(seed)
+    game.handleInputCommand('advance 15')
+    for _ in range(80):
+        game.handleInputCommand(r.choice(['w', 'a', 's', 'd', 'n', 'n', 'sow up', 'sow left', 'reap down',
+                                          'reap right', 'undo', 'redo']))
+    return outcome(game)
+
+@pytest.mark.skipif(main.np is None, reason="the vectorized and parallel engines need NumPy")
+@pytest.mark.parametrize("rng", ["counter", "stdlib", "numpy"])
+def test_engines_agree(monkeypatch, rng):
+    # Split even this small grid between the parallel engine's workers
+    monkeypatch.setattr(main, "PARALLEL_MIN_CELLS", 1)
+    scenario = planted("easy_start", 70, 40)
+    results = {}
+    for name, engine, backend in [("scalar", "scalar", "dense"), ("vectorized", "vectorized", "dense"),
+                                  ("parallel", "parallel", "dense"), ("chunked", "scalar", "chunked")]:
+        game = Game(scenario, headless=True, engine=engine, backend=backend, rng=make_rng(rng, 7), workers=2)
+        try:
+            results[name] = play(game, 3)
+        finally:
+            if isinstance(game.engine, main.ParallelEngine):
+                game.engine.close()
+    assert results["vectorized"] == results["scalar"]
+    assert results["parallel"] == results["scalar"]
+    assert results["chunked"] == results["scalar"]
@@ -0,0 +1,56 @@
+import pytest
+
+from main import Game, load_scenario, make_rng
+
+def settled(game):
+    state = game.settledState()
+    return bytes(state[i] for i in range(len(state)))
+
+@pytest.mark.parametrize("backend", ["dense", "chunked"])
+def test_fork_keeps_the_parents_sun(backend):
+    game = Game(load_scenario("easy_start"), headless=True, backend=backend, rng=make_rng("counter", 3))
+    for command in ['sow up', 'n', 'n', 'sow left', 'n', 'n', 'n']:
+        game.handleInputCommand(command)
+    before = settled(game)
+    game.handleInputCommand('n')
+
+    child = game.fork()
+    assert settled(child) == settled(game)
+    child.handleInputCommand('undo')
+    assert settled(child) == before
+    # From the next turn on the child draws its own weather
+    other = game.fork()
+    child.handleInputCommand('redo')
+    for fork in (child, other):
+        fork.handleInputCommand('n')
+    assert settled(child) != settled(other)
+
+def indexes(game):
+    same = bytes(game.sameNeighbors) if game.sameNeighbors is not None else None
+    return same, sorted(game.activeCells), sorted(game.thirstyCells), game.state_hash()
+
+@pytest.mark.parametrize("backend", ["dense", "chunked"])
+def test_forks_and_parent_dont_see_each_other(backend):
+    commands = ['sow up', 'n', 'sow left', 'n', 'n', 'd', 'sow down', 'n']
+    game = Game(load_scenario("easy_start"), headless=True, backend=backend, rng=make_rng("counter", 3))
+    reference = Game(load_scenario("easy_start"), headless=True, backend=backend, rng=make_rng("counter", 3))
+    for command in commands:
+        game.handleInputCommand(command)
+        reference.handleInputCommand(command)
+
+    child = game.fork()
+    grandchild = child.fork()
+    before = settled(child), indexes(child)
+    for command in ['reap up', 's', 'sow down', 'n', 'undo', 'undo', 'n', 'n']:
+        child.handleInputCommand(command)
+    for command in ['reap left', 'n']:
+        game.handleInputCommand(command)
+        reference.handleInputCommand(command)
+
+    # Neither the child's commands nor the parent's show up in the other game
+    assert settled(game) == settled(reference)
+    assert indexes(game) == indexes(reference)
+    assert settled(grandchild) == before[0] and indexes(grandchild) == before[1]
+    game.handleInputCommand('undo')
+    reference.handleInputCommand('undo')
+    assert settled(game) == settled(reference)
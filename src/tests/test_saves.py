@@ -0,0 +1,182 @@
+import json
+import os
+
+import pytest
+
+import main
+from main import (SAVE_STORE_DIR, AutoSaveWriter, Game, NullRenderer, PlantRegistry, PlantType, SaveJournal, SaveStore, SaveStoreError,
+                  load_scenario, make_rng)
+
+# Runs past the drought of turns 5-9, when sun doesn't depend on the draws
+COMMANDS = ['sow up', 'n', 'n', 'sow left', 'n', 'n', 'reap up', 'n', 'sow right', 'n', 'n', 'n', 'n', 'n', 'n']
+
+def new_game(saveDir, backend, rng, scenario="drought_challenge"):
+    return Game(load_scenario(scenario), rng=rng, backend=backend, saveDir=str(saveDir),
+                renderer=NullRenderer(), backgroundSave=False)
+
+def settled(game):
+    state = game.settledState()
+    return bytes(state[i] for i in range(len(state)))
+
+def load(game, how, saveDir):
+    if how == "autosave":
+        game.resumeAutoSave()
+    elif how == "json":
+        game.loadJsonSave(os.path.join(saveDir, "export.json"))
+    else:
+        game.loadGame(how)
+
+@pytest.mark.parametrize("backend", ["dense", "chunked"])
+@pytest.mark.parametrize("how", ["autosave", "slot", "json"])
+def test_load_restores_settled_sun(tmp_path, backend, how):
+    game = new_game(tmp_path, backend, make_rng("counter", 3))
+    for command in COMMANDS:
+        game.handleInputCommand(command)
+    game.saveGame("slot")
+    game.exportGame("export")
+
+    # A game started with another rng has to pick up the saved one
+    loaded = new_game(tmp_path, backend, make_rng("stdlib", 99))
+    load(loaded, how, tmp_path)
+    assert loaded.state_hash() == game.state_hash()
+    assert settled(loaded) == settled(game)
+    for _ in range(2):
+        game.handleInputCommand('undo')
+        loaded.handleInputCommand('undo')
+    assert settled(loaded) == settled(game)
+
+def test_resumed_journal_keeps_rng(tmp_path):
+    # No weather events, which saves leave out, so the games can play on side by side
+    game = new_game(tmp_path, "dense", make_rng("counter", 3), "easy_start")
+    for command in COMMANDS:
+        game.handleInputCommand(command)
+    resumed = new_game(tmp_path, "dense", make_rng("counter", 4), "easy_start")
+    resumed.resumeAutoSave()
+    # Only the resumed game writes the autosave from here on
+    game.autosave = None
+    for command in ['n', 'sow down', 'n']:
+        game.handleInputCommand(command)
+        resumed.handleInputCommand(command)
+    again = new_game(tmp_path, "dense", make_rng("numpy", 5), "easy_start")
+    again.resumeAutoSave()
+    assert again.getTurnNumber() == game.getTurnNumber()
+    assert settled(again) == settled(game)
+
+def test_json_export_round_trip(tmp_path):
+    game = new_game(tmp_path, "dense", make_rng("counter", 3))
+    for command in COMMANDS:
+        game.handleInputCommand(command)
+    game.exportGame("export")
+    imported = new_game(tmp_path, "dense", make_rng("counter", 4))
+    imported.loadJsonSave(os.path.join(tmp_path, "export.json"))
+    imported.exportGame("again")
+    with open(os.path.join(tmp_path, "export.json")) as f:
+        first = json.load(f)
+    with open(os.path.join(tmp_path, "again.json")) as f:
+        second = json.load(f)
+    assert second["gameState"] == first["gameState"]
+    assert second["history"] == first["history"]
+    # Snapshots carry their own turn's sun, like gameState does
+    assert first["history"][-1] == first["gameState"]
+
+@pytest.mark.parametrize("cut", [3, "header"])
+def test_torn_journal_keeps_later_records(tmp_path, cut):
+    game = new_game(tmp_path, "dense", make_rng("counter", 3), "easy_start")
+    for command in COMMANDS[:6]:
+        game.handleInputCommand(command)
+    path = os.path.join(tmp_path, "autosave.journal")
+    os.truncate(path, 5 if cut == "header" else os.path.getsize(path) - cut)
+    game.autosave = None
+
+    journal = SaveJournal(os.path.join(tmp_path, "autosave"), game.width, game.height)
+    history, reaped, sunChances, rng = journal.load()
+    for command in ['n', 'sow down', 'n']:
+        game.handleInputCommand(command)
+        history.push(game.gameState)
+        journal.record(history, reaped, sunChances, rng)
+
+    history, _, _, _ = SaveJournal(os.path.join(tmp_path, "autosave"), game.width, game.height).load()
+    assert bytes(history.last) == bytes(game.gameState)
+
+def test_store_sees_another_stores_collect(tmp_path):
+    game = new_game(tmp_path, "dense", make_rng("counter", 3))
+    for command in COMMANDS[:6]:
+        game.handleInputCommand(command)
+    game.saveGame("a")
+    # Another store on the directory (a fork's) drops every block of the slot
+    other = SaveStore(game.saves.directory)
+    other.delete("a")
+    other.collect()
+    game.saveGame("a")
+
+    loaded = SaveStore(game.saves.directory).load("a", game.width, game.height)
+    assert bytes(loaded[0].last) == bytes(game.history.last)
+
+def test_damaged_slot_raises(tmp_path):
+    game = new_game(tmp_path, "dense", make_rng("counter", 3))
+    game.saveGame("a")
+    os.truncate(os.path.join(tmp_path, SAVE_STORE_DIR, "blocks.idx"), 0)
+    with pytest.raises(SaveStoreError):
+        SaveStore(game.saves.directory).load("a", game.width, game.height)
+
+@pytest.mark.parametrize("backend", ["dense", "chunked"])
+@pytest.mark.parametrize("how", ["autosave", "slot", "json"])
+def test_load_maps_plant_ids_by_name(tmp_path, monkeypatch, backend, how):
+    game = new_game(tmp_path, backend, make_rng("counter", 3))
+    for command in COMMANDS:
+        game.handleInputCommand(command)
+    # As if the saving session had loaded its crop packs in another order,
+    # giving Corn and Rice each other's IDs
+    names = main.plant_names()
+    swapped = list(names)
+    swapped[PlantType.Corn-1], swapped[PlantType.Rice-1] = names[PlantType.Rice-1], names[PlantType.Corn-1]
+    monkeypatch.setattr(main, "plant_names", lambda: swapped)
+    # The first autosave after the change compacts; the rest go in the journal
+    for command in ['n', 'sow down', 'n']:
+        game.handleInputCommand(command)
+    game.saveGame("slot")
+    game.exportGame("export")
+    monkeypatch.undo()
+
+    loaded = new_game(tmp_path, backend, make_rng("counter", 3))
+    load(loaded, how, tmp_path)
+    assert loaded.getTurnNumber() == game.getTurnNumber()
+    plants = [game.gameState[i] for i in range(2, game.gridDataSize, 4)]
+    swap = {PlantType.Corn: PlantType.Rice, PlantType.Rice: PlantType.Corn}
+    assert {PlantType.Corn, PlantType.Rice} <= set(plants)
+    assert [loaded.gameState[i] for i in range(2, loaded.gridDataSize, 4)] == [swap.get(p, p) for p in plants]
+
+def test_load_rejects_unknown_crops(tmp_path, monkeypatch):
+    game = new_game(tmp_path, "dense", make_rng("counter", 3))
+    game.handleInputCommand('sow up')
+    monkeypatch.setattr(main, "plant_names", lambda: ["Turnip"] + [d.name for d in PlantRegistry.definitions[2:]])
+    game.handleInputCommand('n')
+    game.saveGame("slot")
+    monkeypatch.undo()
+
+    loaded = new_game(tmp_path, "dense", make_rng("counter", 3))
+    with pytest.raises(main.SaveError):
+        loaded.saves.load("slot", loaded.width, loaded.height)
+    loaded.resumeAutoSave()
+    assert loaded.getTurnNumber() == 0
+
+def test_autosave_writer_survives_a_failed_write(tmp_path, monkeypatch, capsys):
+    game = new_game(tmp_path, "dense", make_rng("counter", 3), "easy_start")
+    writer = AutoSaveWriter(coalesceSeconds=0)
+    game.autosave = SaveJournal(os.path.join(tmp_path, "autosave"), game.width, game.height, writer=writer)
+    real = main.write_save_file
+
+    def broken(*args):
+        raise RuntimeError("disk on fire")
+    monkeypatch.setattr(main, "write_save_file", broken)
+    game.handleInputCommand('sow up')
+    writer.flush()
+    assert "disk on fire" in capsys.readouterr().err
+
+    monkeypatch.setattr(main, "write_save_file", real)
+    for command in ['n', 'sow left', 'n']:
+        game.handleInputCommand(command)
+    writer.flush()
+    resumed = new_game(tmp_path, "dense", make_rng("counter", 3), "easy_start")
+    resumed.resumeAutoSave()
+    assert settled(resumed) == settled(game)
@@ -0,0 +1,31 @@
+import json
+import os
+import shutil
+
+import main
+from main import SCENARIO_DIR, load_scenario
+
+def test_scenario_cache_is_json_keyed_on_the_source(tmp_path, monkeypatch):
+    directory = tmp_path / "scenarios"
+    directory.mkdir()
+    shutil.copy(os.path.join(SCENARIO_DIR, "drought_challenge.json"), directory)
+    cacheDir = str(tmp_path / "cache")
+    compiled = load_scenario("drought_challenge", str(directory), cacheDir)
+    (cached,) = os.listdir(cacheDir)
+    with open(os.path.join(cacheDir, cached)) as f:
+        assert json.load(f)["version"] == main.SCENARIO_CACHE_VERSION
+
+    # Another process: nothing in memory, so it reads the cache and skips validation
+    monkeypatch.setattr(main, "_compiledScenarios", {})
+    monkeypatch.setattr(main, "validate_scenario", lambda data: ["validated again"])
+    assert load_scenario("drought_challenge", str(directory), cacheDir) == compiled
+
+    # A changed file gets its own entry
+    monkeypatch.undo()
+    monkeypatch.setattr(main, "_compiledScenarios", {})
+    path = directory / "drought_challenge.json"
+    data = json.loads(path.read_text())
+    data["weatherPolicy"]["rainChance"] = 0.5
+    path.write_text(json.dumps(data))
+    assert load_scenario("drought_challenge", str(directory), cacheDir)["weatherPolicy"]["rainChance"] == 0.5
+    assert len(os.listdir(cacheDir)) == 2